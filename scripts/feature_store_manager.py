@@ -4,67 +4,182 @@ Manages feature store operations using the new simplified schema structure
 """
 
 import pandas as pd
+import numpy as np
 from typing import List, Optional, Dict
 from datetime import datetime
+import time
+from snowflake.connector.pandas_tools import write_pandas
 from snowflake_connection import SnowflakeConnection
 import os
 
 
+# Entity ID lists longer than this are uploaded to a temp table instead of an IN list
+INLINE_ENTITY_ID_LIMIT = 100
+
+
 class FeatureStoreManager:
     """Manages Feature Store operations"""
     
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(self, config_path: Optional[str] = None, cache_ttl: float = 300.0):
         """
         Initialize Feature Store Manager
         
         Args:
             config_path: Path to Snowflake config file
+            cache_ttl: Seconds the cached wide feature frame stays valid
         """
         self.sf = SnowflakeConnection(config_path)
         self.sf.connect()
         self.db_name = self.sf.config.get('database', 'FEAT_DB')
         self.schema_name = self.sf.config.get('schema', 'FEAT_SCHEMA')
+        self._feature_names = None
+        self.cache_ttl = cache_ttl
+        self._latest_cache = None
+        self._latest_cache_time = 0.0
+    
+    def get_feature_names(self) -> List[str]:
+        """
+        Get the distinct feature names in the feature store
+        The list is cached after the first call since it drives the pivot queries
+        
+        Returns:
+            List of feature names
+        """
+        if self._feature_names is None:
+            query = f"""
+            SELECT DISTINCT feature_name
+            FROM {self.db_name}.{self.schema_name}.latest_features
+            WHERE feature_name IS NOT NULL
+            ORDER BY feature_name
+            """
+            df = self.sf.execute_query(query)
+            self._feature_names = df['FEATURE_NAME'].tolist() if len(df) > 0 else []
+        return self._feature_names
+    
+    def _build_pivot_query(self, 
+                           source: str, 
+                           where_clause: str, 
+                           feature_names: List[str]) -> str:
+        """
+        Build a query that pivots key-value rows to wide format inside Snowflake
+        
+        Args:
+            source: Table, view or subquery holding entity_id/feature_name/feature_value rows
+            where_clause: Filter applied to the source rows
+            feature_names: Feature names to turn into columns
+            
+        Returns:
+            SQL query returning one row per entity
+        """
+        # Quoted aliases keep the original (lowercase) feature names as column names
+        feature_cols = ",\n            ".join(
+            "MAX(CASE WHEN feature_name = '{}' THEN feature_value END) AS \"{}\"".format(
+                name.replace("'", "''"), name.replace('"', '""')
+            )
+            for name in feature_names
+        )
+        return f"""
+        SELECT 
+            entity_id AS "entity_id",
+            {feature_cols}
+        FROM {source}
+        WHERE {where_clause}
+        GROUP BY entity_id
+        """
     
-    def get_latest_features(self, entity_ids: Optional[List[str]] = None) -> pd.DataFrame:
+    def get_latest_features(self, 
+                            entity_ids: Optional[List[str]] = None,
+                            use_cache: bool = False) -> pd.DataFrame:
         """
         Retrieve latest features for entities (customers)
         Returns features in wide format (pivoted from key-value store)
         
         Args:
             entity_ids: List of entity IDs (customer IDs). If None, returns all entities
+            use_cache: If True, serve from the in-process cache of all latest features.
+                       Lookups of specific entities only use the cache when it is already
+                       warm, rather than fetching the whole store to score a few entities
             
         Returns:
             DataFrame with features in wide format (one row per entity)
         """
-        if entity_ids:
-            entity_list = "', '".join(entity_ids)
-            query = f"""
-            SELECT * 
-            FROM {self.db_name}.{self.schema_name}.latest_features
-            WHERE entity_id IN ('{entity_list}')
-            """
-        else:
-            query = f"""
-            SELECT * 
-            FROM {self.db_name}.{self.schema_name}.latest_features
-            WHERE entity_id IS NOT NULL
-            """
+        if use_cache and not entity_ids:
+            # A copy, so callers can modify it without corrupting the cache
+            return self._fetch_all_latest_wide().copy()
+        if use_cache and self._cache_is_warm():
+            df = self._latest_cache
+            if len(df) == 0:
+                return pd.DataFrame()
+            # Boolean indexing returns a new frame, the cache itself is never handed out
+            return df[df['entity_id'].isin(entity_ids)].reset_index(drop=True)
         
-        df = self.sf.execute_query(query)
-        
-        # Pivot from key-value format to wide format
-        if len(df) > 0:
-            df_wide = df.pivot_table(
-                index='ENTITY_ID',
-                columns='FEATURE_NAME',
-                values='FEATURE_VALUE',
-                aggfunc='first'
-            ).reset_index()
-            df_wide.columns.name = None
-            df_wide = df_wide.rename(columns={'ENTITY_ID': 'entity_id'})
-            return df_wide
-        else:
+        feature_names = self.get_feature_names()
+        if not feature_names:
             return pd.DataFrame()
+        
+        source = f"{self.db_name}.{self.schema_name}.latest_features"
+        where_clause = "entity_id IS NOT NULL"
+        params = None
+        if entity_ids and len(entity_ids) > INLINE_ENTITY_ID_LIMIT:
+            # Join against the uploaded IDs rather than sending a huge IN list
+            id_table = self._load_entity_id_table(entity_ids)
+            source = f"""(
+            SELECT lf.entity_id, lf.feature_name, lf.feature_value
+            FROM {source} lf
+            JOIN {id_table} ids ON lf.entity_id = ids.entity_id
+        )"""
+        elif entity_ids:
+            placeholders = ", ".join(["%s"] * len(entity_ids))
+            where_clause = f"entity_id IN ({placeholders})"
+            params = tuple(entity_ids)
+        
+        query = self._build_pivot_query(source, where_clause, feature_names)
+        
+        df = self.sf.execute_query(query, params)
+        return df if len(df) > 0 else pd.DataFrame()
+    
+    def _load_entity_id_table(self, entity_ids: List[str]) -> str:
+        """
+        Upload entity IDs to a session-scoped temporary table
+        
+        Args:
+            entity_ids: List of entity IDs (customer IDs)
+            
+        Returns:
+            Fully qualified name of the temporary table
+        """
+        table_name = f"{self.db_name}.{self.schema_name}.entity_id_filter"
+        self.sf.execute_update(f"CREATE OR REPLACE TEMPORARY TABLE {table_name} (entity_id STRING)")
+        write_pandas(
+            self.sf.conn,
+            pd.DataFrame({'ENTITY_ID': list(dict.fromkeys(entity_ids))}),
+            'ENTITY_ID_FILTER',
+            database=self.db_name,
+            schema=self.schema_name
+        )
+        return table_name
+    
+    def _cache_is_warm(self) -> bool:
+        """True if the cached wide frame exists and hasn't expired"""
+        return (
+            self._latest_cache is not None
+            and time.monotonic() - self._latest_cache_time <= self.cache_ttl
+        )
+    
+    def _fetch_all_latest_wide(self) -> pd.DataFrame:
+        """
+        Get the wide frame of all latest features, cached for cache_ttl seconds
+        The cache is invalidated by refresh_features()
+        """
+        if not self._cache_is_warm():
+            self._latest_cache = self.get_features_for_training()
+            self._latest_cache_time = time.monotonic()
+        return self._latest_cache
+    
+    def invalidate_cache(self):
+        """Drop cached feature names and feature values"""
+        self._feature_names = None
+        self._latest_cache = None
     
     def get_features_for_training(self, 
                                    filters: Optional[Dict] = None,
@@ -79,20 +194,94 @@ class FeatureStoreManager:
         Returns:
             DataFrame with features ready for training
         """
-        # Get all features
-        df = self.get_latest_features()
-        
-        if len(df) == 0:
-            return pd.DataFrame()
+        feature_names = self.get_feature_names()
         
         # Select specific columns if requested
         if feature_columns:
-            available_cols = [col for col in feature_columns if col in df.columns]
+            available_cols = [col for col in feature_columns if col in feature_names]
             if available_cols:
-                df = df[['entity_id'] + available_cols]
+                feature_names = available_cols
         
+        if not feature_names:
+            return pd.DataFrame()
+        
+        query = self._build_pivot_query(
+            f"{self.db_name}.{self.schema_name}.latest_features",
+            "entity_id IS NOT NULL",
+            feature_names
+        )
+        
+        # Keep each streamed chunk as numpy columns and concatenate once at the end
+        entity_chunks = []
+        value_chunks = []
+        for batch in self.sf.stream_query(query):
+            if batch.num_rows == 0:
+                continue
+            entity_chunks.append(batch.column('entity_id').to_numpy())
+            value_chunks.append(np.column_stack([
+                batch.column(name).to_numpy().astype(np.float64)
+                for name in feature_names
+            ]))
+        
+        if not entity_chunks:
+            return pd.DataFrame()
+        
+        df = pd.DataFrame(np.concatenate(value_chunks), columns=feature_names)
+        df.insert(0, 'entity_id', np.concatenate(entity_chunks))
         return df
     
+    def get_features_for_training_partition(self, part: int, n_parts: int) -> pd.DataFrame:
+        """
+        Retrieve one hash partition of the training features
+        Entities are assigned to partitions by HASH(entity_id), so partitions are disjoint
+        
+        Args:
+            part: Partition number, from 0 to n_parts - 1
+            n_parts: Total number of partitions
+            
+        Returns:
+            DataFrame with features in wide format for the entities in the partition
+        """
+        feature_names = self.get_feature_names()
+        if not feature_names:
+            return pd.DataFrame()
+        
+        query = self._build_pivot_query(
+            f"{self.db_name}.{self.schema_name}.latest_features",
+            "entity_id IS NOT NULL AND MOD(ABS(HASH(entity_id)), %s) = %s",
+            feature_names
+        )
+        
+        df = self.sf.execute_query(query, (n_parts, part))
+        return df if len(df) > 0 else pd.DataFrame()
+    
+    def get_feature_medians(self, feature_names: List[str]) -> Dict[str, float]:
+        """
+        Get the median of each feature across all entities, computed in Snowflake
+        
+        Args:
+            feature_names: Feature names
+            
+        Returns:
+            Dictionary of feature name to median (features without values are omitted)
+        """
+        if not feature_names:
+            return {}
+        
+        placeholders = ', '.join(['%s'] * len(feature_names))
+        query = f"""
+        SELECT feature_name, PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY feature_value) AS median_value
+        FROM {self.db_name}.{self.schema_name}.latest_features
+        WHERE feature_name IN ({placeholders})
+        GROUP BY feature_name
+        """
+        df = self.sf.execute_query(query, list(feature_names))
+        return {
+            name: float(value)
+            for name, value in zip(df['FEATURE_NAME'], df['MEDIAN_VALUE'])
+            if pd.notna(value)
+        }
+    
     def get_point_in_time_features(self, 
                                     entity_id: str, 
                                     timestamp: datetime) -> pd.DataFrame:
@@ -106,72 +295,106 @@ class FeatureStoreManager:
         Returns:
             DataFrame with historical features
         """
-        query = f"""
-        SELECT 
-            entity_id,
-            feature_name,
-            feature_value,
-            feature_ts
-        FROM {self.db_name}.{self.schema_name}.feature_store
-        WHERE entity_id = '{entity_id}'
-            AND feature_ts <= '{timestamp.strftime('%Y-%m-%d %H:%M:%S')}'
-        QUALIFY ROW_NUMBER() OVER (
-            PARTITION BY entity_id, feature_name 
-            ORDER BY feature_ts DESC
-        ) = 1
-        """
-        
-        df = self.sf.execute_query(query)
-        
-        # Pivot to wide format
-        if len(df) > 0:
-            df_wide = df.pivot_table(
-                index='ENTITY_ID',
-                columns='FEATURE_NAME',
-                values='FEATURE_VALUE',
-                aggfunc='first'
-            ).reset_index()
-            df_wide.columns.name = None
-            df_wide = df_wide.rename(columns={'ENTITY_ID': 'entity_id'})
-            return df_wide
-        else:
+        feature_names = self.get_feature_names()
+        if not feature_names:
             return pd.DataFrame()
+        
+        # Latest value of each feature as of the timestamp, pivoted in the same query
+        source = f"""(
+            SELECT entity_id, feature_name, feature_value
+            FROM {self.db_name}.{self.schema_name}.feature_store
+            WHERE entity_id = %s
+                AND feature_ts <= %s
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY entity_id, feature_name 
+                ORDER BY feature_ts DESC
+            ) = 1
+        )"""
+        query = self._build_pivot_query(source, "entity_id IS NOT NULL", feature_names)
+        params = (entity_id, timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        
+        df = self.sf.execute_query(query, params)
+        return df if len(df) > 0 else pd.DataFrame()
     
-    def refresh_features(self) -> int:
+    def _refresh_features_sql(self) -> str:
         """
-        Refresh features in the feature store by recomputing from customer_agg_30d view
-        
-        Returns:
-            Number of rows inserted
+        Build the MERGE that inserts fresh avg_tx_amount_30d features
+        The 30-day average is aggregated live from tx_cleaned, since the customer_agg_30d
+        roll-up table is only rebuilt by refresh_feature_data.py and may be stale.
+        Entities that already got the feature within the last hour are skipped
         """
-        query = f"""
-        INSERT INTO {self.db_name}.{self.schema_name}.feature_store 
+        return f"""
+        MERGE INTO {self.db_name}.{self.schema_name}.feature_store t
+        USING (
+            SELECT customer_id, AVG(amount_filled) AS avg_tx_amount_30d
+            FROM {self.db_name}.{self.schema_name}.tx_cleaned
+            WHERE transaction_ts >= DATEADD(day, -30, CURRENT_TIMESTAMP())
+            GROUP BY customer_id
+        ) s
+        ON t.entity_id = s.customer_id
+            AND t.feature_name = 'avg_tx_amount_30d'
+            AND t.feature_ts >= DATEADD('hour', -1, CURRENT_TIMESTAMP())
+        WHEN NOT MATCHED THEN INSERT 
             (feature_id, entity_id, feature_name, feature_value, created_at, feature_ts, source)
-        SELECT
-            CONCAT(customer_id, '_avg_tx_30d') as feature_id,
-            customer_id AS entity_id,
-            'avg_tx_amount_30d' AS feature_name,
-            avg_tx_amount_30d AS feature_value,
-            CURRENT_TIMESTAMP() AS created_at,
-            CURRENT_TIMESTAMP() AS feature_ts,
-            'sql_agg_30d' AS source
-        FROM {self.db_name}.{self.schema_name}.customer_agg_30d
-        WHERE customer_id NOT IN (
-            SELECT entity_id 
-            FROM {self.db_name}.{self.schema_name}.feature_store 
-            WHERE feature_ts >= DATEADD('hour', -1, CURRENT_TIMESTAMP())
-                AND feature_name = 'avg_tx_amount_30d'
+        VALUES (
+            CONCAT(s.customer_id, '_avg_tx_30d'),
+            s.customer_id,
+            'avg_tx_amount_30d',
+            s.avg_tx_amount_30d,
+            CURRENT_TIMESTAMP(),
+            CURRENT_TIMESTAMP(),
+            'sql_agg_30d'
         )
         """
+    
+    def refresh_features(self) -> int:
+        """
+        Refresh features in the feature store from the latest 30 days of tx_cleaned
         
+        Returns:
+            Number of rows inserted
+        """
         try:
-            rows_inserted = self.sf.execute_update(query)
+            rows_inserted = self.sf.execute_update(self._refresh_features_sql())
+            self.invalidate_cache()
             print(f"Refreshed {rows_inserted} feature records")
             return rows_inserted
         except Exception as e:
             print(f"Error refreshing features: {e}")
             return 0
     
+    def create_refresh_task(self, 
+                            cron: str = '0 * * * * UTC',
+                            task_name: str = 'feature_refresh_task') -> bool:
+        """
+        Schedule the feature refresh as a Snowflake task
+        
+        Args:
+            cron: Cron expression (with time zone) for the task schedule
+            task_name: Name of the task to create
+            
+        Returns:
+            True if the task was created and resumed
+        """
+        task = f"{self.db_name}.{self.schema_name}.{task_name}"
+        query = f"""
+        CREATE OR REPLACE TASK {task}
+            WAREHOUSE = {self.sf.config.get('warehouse', 'COMPUTE_WH')}
+            SCHEDULE = 'USING CRON {cron}'
+        AS
+        {self._refresh_features_sql()}
+        """
+        
+        try:
+            self.sf.execute_update(query)
+            # Tasks are created suspended
+            self.sf.execute_update(f"ALTER TASK {task} RESUME")
+            print(f"Scheduled feature refresh task {task} ({cron})")
+            return True
+        except Exception as e:
+            print(f"Error creating refresh task: {e}")
+            return False
+    
     def get_feature_statistics(self) -> pd.DataFrame:
         """
         Get statistics about features in the feature store
@@ -194,6 +417,23 @@ class FeatureStoreManager:
         
         return self.sf.execute_query(query)
     
+    def get_feature_store_version(self) -> Optional[str]:
+        """
+        Get a version key for the feature store contents
+        Based on the newest feature timestamp, so it changes whenever features are refreshed
+        
+        Returns:
+            Version string, or None if the feature store is empty
+        """
+        query = f"""
+        SELECT MAX(feature_ts)
+        FROM {self.db_name}.{self.schema_name}.feature_store
+        """
+        max_feature_ts = self.sf.execute_scalar(query)
+        if max_feature_ts is None:
+            return None
+        return max_feature_ts.strftime('%Y%m%d%H%M%S%f')
+    
     def get_all_features_for_entity(self, entity_id: str) -> pd.DataFrame:
         """
         Get all features for a specific entity in key-value format
@@ -211,15 +451,20 @@ class FeatureStoreManager:
             feature_value,
             feature_ts
         FROM {self.db_name}.{self.schema_name}.latest_features
-        WHERE entity_id = '{entity_id}'
+        WHERE entity_id = %s
         ORDER BY feature_name
         """
         
-        return self.sf.execute_query(query)
+        return self.sf.execute_query(query, (entity_id,))
     
-    def close(self):
-        """Close connection"""
-        self.sf.close()
+    def close(self, keep_alive: bool = True):
+        """
+        Close connection
+        
+        Args:
+            keep_alive: If False, end the Snowflake session instead of pooling it for reuse
+        """
+        self.sf.close(keep_alive=keep_alive)
 
 
 def main():
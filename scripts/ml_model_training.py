@@ -5,17 +5,112 @@ Demonstrates how to retrieve features and train a model
 
 import pandas as pd
 import numpy as np
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.ensemble import HistGradientBoostingRegressor, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score, accuracy_score, classification_report
 from feature_store_manager import FeatureStoreManager
+import gc
+import glob
 import os
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
 import warnings
 warnings.filterwarnings('ignore')
 
 
+# Features derived from entity_id when the store has no usable feature columns
+SYNTHETIC_FEATURES = ('entity_id_numeric', 'entity_id_hash')
+
+# Report labels for the synthesized binary classification target
+BINARY_TARGET_LABELS = {0: 'Low Value', 1: 'High Value'}
+
+# Rows of the test split used for permutation importance, which re-predicts it once per feature and repeat
+IMPORTANCE_MAX_SAMPLES = 10000
+
+# Upper bound on concurrent partition workers (each holds its own Snowflake connection)
+MAX_PARTITION_WORKERS = 4
+
+
+class FeatureImportance:
+    """Feature importances sorted from most to least important"""
+    
+    def __init__(self, features: List[str], importances: np.ndarray):
+        """
+        Initialize Feature Importance
+        
+        Args:
+            features: Feature names
+            importances: Importance score of each feature, in the same order
+        """
+        order = np.argsort(importances)[::-1]
+        self.features = [features[i] for i in order]
+        self.importances = np.asarray(importances)[order]
+    
+    def top(self, n: int = 10) -> List[Tuple[str, float]]:
+        """Return the n most important (feature, importance) pairs"""
+        return list(zip(self.features[:n], self.importances[:n].tolist()))
+    
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return the importances as a DataFrame with feature and importance columns"""
+        return pd.DataFrame({'feature': self.features, 'importance': self.importances})
+
+
+class AveragedModel:
+    """Regression model that averages the predictions of models trained on disjoint partitions"""
+    
+    def __init__(self, models: List[object]):
+        """
+        Initialize Averaged Model
+        
+        Args:
+            models: Fitted regression models
+        """
+        self.models = models
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Average the predictions of all partition models"""
+        return np.mean([model.predict(X) for model in self.models], axis=0)
+
+
+def _train_partition(config_path: Optional[str],
+                     part: int,
+                     n_parts: int,
+                     feature_columns: List[str],
+                     target_column: str,
+                     medians: Dict[str, float],
+                     random_state: int) -> Optional[object]:
+    """
+    Fit a regression model on one hash partition of the feature store
+    Runs in a worker process with its own Snowflake connection
+    Missing values are filled with the global medians, the same ones used at prediction time
+    
+    Returns:
+        Fitted model, or None if the partition has no usable rows
+    """
+    fs_manager = FeatureStoreManager(config_path)
+    try:
+        df = fs_manager.get_features_for_training_partition(part, n_parts)
+    finally:
+        # Workers exit without running atexit handlers, so a pooled session would leak
+        fs_manager.close(keep_alive=False)
+    
+    if len(df) == 0 or target_column not in df.columns:
+        return None
+    df = df[df[target_column].notna()]
+    if len(df) == 0:
+        return None
+    
+    X = df.reindex(columns=feature_columns).astype(np.float32)
+    X = X.fillna(value=medians).fillna(0.0)
+    y = df[target_column].astype(np.float32)
+    
+    model = HistGradientBoostingRegressor(**MLModelTrainer._model_params(len(X), random_state))
+    model.fit(X.to_numpy(), y.to_numpy())
+    return model
+
 
 class MLModelTrainer:
     """Trains ML models using features from Feature Store"""
@@ -27,31 +122,177 @@ class MLModelTrainer:
         Args:
             config_path: Path to Snowflake config file
         """
+        self.config_path = config_path
         self.fs_manager = FeatureStoreManager(config_path)
         self.label_encoders = {}
+        self._median_cache: Dict[str, float] = {}
+        # entity_id order behind entity_id_numeric codes, fixed at training time
+        self._entity_categories: Optional[pd.Index] = None
     
-    def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def prepare_features(self, df: pd.DataFrame, fit: bool = False) -> pd.DataFrame:
         """
         Prepare features for ML model
         
+        Missing values are filled in place, so callers own the frame they pass in
+        
         Args:
             df: Raw feature DataFrame
+            fit: If True, (re)compute the column medians used for imputation and cache them
             
         Returns:
             Processed DataFrame ready for modeling
         """
-        df = df.copy()
-        
-        # Handle missing values
+        # Handle missing values, reusing the medians from training when available
         numeric_cols = df.select_dtypes(include=[np.number]).columns
-        df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
+        if fit or any(col not in self._median_cache for col in numeric_cols):
+            medians = df[numeric_cols].median()
+            if fit:
+                self._median_cache = medians.to_dict()
+            df[numeric_cols] = df[numeric_cols].fillna(medians)
+        else:
+            df[numeric_cols] = df[numeric_cols].fillna(value=self._median_cache)
         
         return df
     
+    def _get_training_frame(self) -> pd.DataFrame:
+        """
+        Retrieve the training frame, shared by all trainers
+        The frame is cached in a local Parquet file keyed by the feature store version,
+        so training several models only fetches it from Snowflake once
+        
+        Returns:
+            DataFrame with features in wide format
+        """
+        version = self.fs_manager.get_feature_store_version()
+        if version is None:
+            return self.fs_manager.get_features_for_training()
+        
+        cache_prefix = os.path.join(
+            tempfile.gettempdir(),
+            f"feature_cache_{self.fs_manager.db_name}_{self.fs_manager.schema_name}_"
+        )
+        cache_path = f"{cache_prefix}{version}.parquet"
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
+        
+        df = self.fs_manager.get_features_for_training()
+        if len(df) > 0:
+            # Write under a temporary name and rename, so concurrent trainers never read a partial file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+            
+            # Earlier versions can't be hit again once the store has moved on
+            for old_path in glob.glob(f"{glob.escape(cache_prefix)}*.parquet"):
+                if old_path != cache_path:
+                    try:
+                        os.remove(old_path)
+                    except OSError:
+                        pass
+        return df
+    
+    @staticmethod
+    def _model_params(n_samples: int, random_state: int) -> Dict:
+        """
+        Hyperparameters shared by the regression and classification models
+        
+        Args:
+            n_samples: Number of training records
+            random_state: Random seed
+            
+        Returns:
+            Keyword arguments for the gradient boosting estimators
+        """
+        return {
+            'max_iter': 200,
+            'max_depth': 12,
+            # 20 rows per leaf on real data; scales down so tiny demo datasets can still split
+            'min_samples_leaf': min(20, max(1, n_samples // 10)),
+            'early_stopping': 'auto',
+            'random_state': random_state
+        }
+    
+    @staticmethod
+    def _feature_importance(model: object,
+                            features: List[str],
+                            X_test: np.ndarray,
+                            y_test: np.ndarray,
+                            random_state: int) -> Optional[FeatureImportance]:
+        """
+        Permutation importance of each feature, measured on held-out data
+        Gradient boosting has no impurity-based importances
+        
+        Args:
+            model: Fitted model
+            features: Feature names, in column order
+            X_test: Test features
+            y_test: Test target
+            random_state: Random seed
+            
+        Returns:
+            FeatureImportance sorted from most to least important, or None if the
+            test split is too small to score
+        """
+        if len(X_test) < 2:
+            # Scores like R² are undefined on a single row
+            print("\nSkipping feature importance: test split has fewer than 2 records")
+            return None
+        
+        importances = permutation_importance(
+            model, X_test, y_test, 
+            n_repeats=5, 
+            max_samples=min(len(X_test), IMPORTANCE_MAX_SAMPLES),
+            random_state=random_state
+        ).importances_mean
+        return FeatureImportance(features, importances)
+    
+    def refit(self, model: object, X: np.ndarray, y: np.ndarray, extra_iters: int = 50) -> object:
+        """
+        Grow a trained model with additional boosting iterations
+        Uses warm_start, so the existing trees are kept instead of training from scratch
+        
+        Args:
+            model: Model returned by one of the train_*_model methods
+            X: Training features
+            y: Training target
+            extra_iters: Number of boosting iterations to add
+            
+        Returns:
+            The same model, fitted with the extra iterations
+        """
+        model.set_params(warm_start=True, max_iter=model.max_iter + extra_iters)
+        model.fit(X, y)
+        return model
+    
+    def _ensure_synthetic_features(self, df: pd.DataFrame, fit: bool = False) -> List[str]:
+        """
+        Add synthetic features derived from entity_id (in place)
+        
+        Args:
+            df: Feature DataFrame with an entity_id column
+            fit: If True, record the entity_id order behind the entity_id_numeric codes.
+                 Otherwise the order recorded at training time is reused (unseen ids get -1)
+            
+        Returns:
+            Names of the synthetic feature columns
+        """
+        if fit or self._entity_categories is None:
+            categories = pd.Categorical(df['entity_id']).categories
+            if fit:
+                self._entity_categories = categories
+        else:
+            categories = self._entity_categories
+        df['entity_id_numeric'] = pd.Categorical(df['entity_id'], categories=categories).codes
+        # Vectorized, deterministic hash (Python's hash() is salted per process)
+        entity_hash = pd.util.hash_array(df['entity_id'].to_numpy(dtype=object)) % 1000
+        df['entity_id_hash'] = entity_hash.astype(np.int32)
+        return list(SYNTHETIC_FEATURES)
+    
     def train_regression_model(self, 
                               target_column: str = 'avg_tx_amount_30d',
                               test_size: float = 0.2,
-                              random_state: int = 42) -> Dict:
+                              random_state: int = 42,
+                              compute_importance: bool = False) -> Dict:
         """
         Train a regression model to predict a continuous target
         
@@ -59,20 +300,21 @@ class MLModelTrainer:
             target_column: Name of target column (must exist in data)
             test_size: Proportion of data for testing
             random_state: Random seed
+            compute_importance: If True, compute permutation feature importance on the test split
             
         Returns:
             Dictionary with model and metrics
         """
         # Get features from Feature Store
         print("Retrieving features from Feature Store...")
-        df = self.fs_manager.get_features_for_training()
+        df = self._get_training_frame()
         print(f"Retrieved {len(df)} records")
         
         if len(df) == 0:
             raise ValueError("No features found in Feature Store. Run sql/snowflake_feature_engineering.sql first.")
         
         # Prepare features
-        df = self.prepare_features(df)
+        df = self.prepare_features(df, fit=True)
         
         # If target doesn't exist, create a synthetic one for demonstration
         if target_column not in df.columns:
@@ -98,16 +340,15 @@ class MLModelTrainer:
         # If we only have one feature and it's the target, create additional features
         if len(feature_cols) == 0:
             print("Warning: No features available after excluding target. Creating synthetic features...")
-            # Create synthetic features based on entity_id or other available data
-            df['entity_id_numeric'] = pd.Categorical(df['entity_id']).codes
-            # Use a simple hash function (avoiding conflict with built-in hash)
-            def simple_hash(s):
-                return abs(hash(str(s))) % 1000
-            df['entity_id_hash'] = df['entity_id'].apply(simple_hash)
-            feature_cols = ['entity_id_numeric', 'entity_id_hash']
-        
-        X = df[feature_cols].select_dtypes(include=[np.number])
-        y = df[target_column]
+            feature_cols = self._ensure_synthetic_features(df, fit=True)
+        
+        # float32 halves the working set for scaling and tree building
+        X = df[feature_cols].select_dtypes(include=[np.number]).astype(np.float32)
+        y = df[target_column].astype(np.float32)
+        
+        # Release the full feature frame before fitting
+        del df
+        gc.collect()
         
         # Remove rows with missing target
         mask = ~y.isna()
@@ -129,24 +370,18 @@ class MLModelTrainer:
             X, y, test_size=test_size, random_state=random_state
         )
         
-        # Create a new scaler for this model
-        scaler = StandardScaler()
-        
-        # Scale features (only if we have features)
-        if X_train.shape[1] > 0:
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-        else:
-            raise ValueError("No features to scale. Cannot train model.")
+        # Tree-based models are scale-invariant, so features are used unscaled
+        X_train_values = X_train.to_numpy()
+        X_test_values = X_test.to_numpy()
         
         # Train model
-        print(f"\nTraining Random Forest Regressor to predict '{target_column}'...")
-        model = RandomForestRegressor(n_estimators=100, random_state=random_state, n_jobs=-1)
-        model.fit(X_train_scaled, y_train)
+        print(f"\nTraining Histogram Gradient Boosting Regressor to predict '{target_column}'...")
+        model = HistGradientBoostingRegressor(**self._model_params(len(X_train), random_state))
+        model.fit(X_train_values, y_train)
         
         # Predictions
-        y_train_pred = model.predict(X_train_scaled)
-        y_test_pred = model.predict(X_test_scaled)
+        y_train_pred = model.predict(X_train_values)
+        y_test_pred = model.predict(X_test_values)
         
         # Metrics
         train_rmse = np.sqrt(mean_squared_error(y_train, y_train_pred))
@@ -160,18 +395,22 @@ class MLModelTrainer:
         print(f"Train R²: {train_r2:.4f}")
         print(f"Test R²: {test_r2:.4f}")
         
-        # Feature importance
-        feature_importance = pd.DataFrame({
-            'feature': X.columns,
-            'importance': model.feature_importances_
-        }).sort_values('importance', ascending=False)
+        # Feature importance on the test split (opt-in, it re-predicts once per feature and repeat)
+        feature_importance = None
+        if compute_importance:
+            feature_importance = self._feature_importance(
+                model, X.columns.tolist(), X_test_values, y_test, random_state
+            )
         
-        print(f"\nTop 10 Most Important Features:")
-        print(feature_importance.head(10))
+        if feature_importance is not None:
+            print(f"\nTop 10 Most Important Features:")
+            for feature, importance in feature_importance.top(10):
+                print(f"{feature}: {importance:.4f}")
         
         return {
             'model': model,
-            'scaler': scaler,
+            'scaler': None,
+            'medians': dict(self._median_cache),
             'feature_columns': X.columns.tolist(),
             'train_rmse': train_rmse,
             'test_rmse': test_rmse,
@@ -183,10 +422,61 @@ class MLModelTrainer:
             'y_test_pred': y_test_pred
         }
     
+    def train_partitioned_regression_model(self,
+                                           target_column: str = 'avg_tx_amount_30d',
+                                           n_parts: int = 4,
+                                           random_state: int = 42) -> Dict:
+        """
+        Train a regression model in parallel over hash partitions of the feature store
+        Each worker process fetches one partition and fits a sub-model; predictions are averaged
+        
+        Args:
+            target_column: Name of target column (must exist in the feature store)
+            n_parts: Number of partitions
+            random_state: Random seed
+            
+        Returns:
+            Dictionary with the combined model
+        """
+        feature_names = self.fs_manager.get_feature_names()
+        if target_column not in feature_names:
+            raise ValueError(f"Target column '{target_column}' not found in Feature Store.")
+        feature_columns = [col for col in feature_names if col != target_column]
+        if not feature_columns:
+            raise ValueError("No numeric features available for training. Need at least one feature column.")
+        
+        # Impute every partition with the same global medians, and return them for prediction
+        medians = self.fs_manager.get_feature_medians(feature_columns)
+        
+        print(f"\nTraining {n_parts} partition models to predict '{target_column}'...")
+        with ProcessPoolExecutor(max_workers=min(n_parts, MAX_PARTITION_WORKERS)) as executor:
+            futures = [
+                executor.submit(
+                    _train_partition, self.config_path, part, n_parts,
+                    feature_columns, target_column, medians, random_state
+                )
+                for part in range(n_parts)
+            ]
+            models = [future.result() for future in futures]
+        models = [model for model in models if model is not None]
+        
+        if not models:
+            raise ValueError("No valid data for training in any partition")
+        print(f"Trained {len(models)} partition models")
+        
+        return {
+            'model': AveragedModel(models),
+            'scaler': None,
+            'medians': medians,
+            'feature_columns': feature_columns,
+            'n_partitions': len(models)
+        }
+    
     def train_classification_model(self,
                                   target_column: str = 'high_value_customer',
                                   test_size: float = 0.2,
-                                  random_state: int = 42) -> Dict:
+                                  random_state: int = 42,
+                                  compute_importance: bool = False) -> Dict:
         """
         Train a classification model
         
@@ -194,39 +484,36 @@ class MLModelTrainer:
             target_column: Name of target column (will be created if doesn't exist)
             test_size: Proportion of data for testing
             random_state: Random seed
+            compute_importance: If True, compute permutation feature importance on the test split
             
         Returns:
             Dictionary with model and metrics
         """
         # Get features from Feature Store
         print("Retrieving features from Feature Store...")
-        df = self.fs_manager.get_features_for_training()
+        df = self._get_training_frame()
         print(f"Retrieved {len(df)} records")
         
         if len(df) == 0:
             raise ValueError("No features found in Feature Store. Run sql/snowflake_feature_engineering.sql first.")
         
         # Prepare features
-        df = self.prepare_features(df)
+        df = self.prepare_features(df, fit=True)
         
         # Create target if it doesn't exist
         if target_column not in df.columns:
             print(f"Target column '{target_column}' not found. Creating binary classification target...")
-            # Create synthetic binary classification target based on avg_tx_amount_30d
+            # Threshold avg_tx_amount_30d at its median, else the first numeric column
+            numeric_cols = df.select_dtypes(include=[np.number]).columns
             if 'avg_tx_amount_30d' in df.columns:
-                median_value = df['avg_tx_amount_30d'].median()
-                df[target_column] = (df['avg_tx_amount_30d'] > median_value).astype(int)
-                df[target_column] = df[target_column].map({0: 'Low Value', 1: 'High Value'})
+                base_col = 'avg_tx_amount_30d'
+            elif len(numeric_cols) > 0:
+                base_col = numeric_cols[0]
             else:
-                # Use first numeric column
-                numeric_cols = df.select_dtypes(include=[np.number]).columns
-                if len(numeric_cols) > 0:
-                    base_col = numeric_cols[0]
-                    median_value = df[base_col].median()
-                    df[target_column] = (df[base_col] > median_value).astype(int)
-                    df[target_column] = df[target_column].map({0: 'Low Value', 1: 'High Value'})
-                else:
-                    raise ValueError("Cannot create classification target. No numeric features available.")
+                raise ValueError("Cannot create classification target. No numeric features available.")
+            median_value = df[base_col].median()
+            df[target_column] = (df[base_col] > median_value).astype(np.int8)
+            self.label_encoders[target_column] = BINARY_TARGET_LABELS
         
         # Select feature columns
         exclude_cols = ['entity_id', target_column]
@@ -235,17 +522,15 @@ class MLModelTrainer:
         # If we only have one feature and it's the target, create additional features
         if len(feature_cols) == 0:
             print("Warning: No features available after excluding target. Creating synthetic features...")
-            # Create synthetic features based on entity_id or other available data
-            df['entity_id_numeric'] = pd.Categorical(df['entity_id']).codes
-            # Use a simple hash function (avoiding conflict with built-in hash)
-            def simple_hash(s):
-                return abs(hash(str(s))) % 1000
-            df['entity_id_hash'] = df['entity_id'].apply(simple_hash)
-            feature_cols = ['entity_id_numeric', 'entity_id_hash']
-        
-        X = df[feature_cols].select_dtypes(include=[np.number])
+            feature_cols = self._ensure_synthetic_features(df, fit=True)
+        
+        X = df[feature_cols].select_dtypes(include=[np.number]).astype(np.float32)
         y = df[target_column]
         
+        # Release the full feature frame before fitting
+        del df
+        gc.collect()
+        
         # Remove rows with missing target
         mask = ~y.isna()
         X = X[mask]
@@ -258,15 +543,13 @@ class MLModelTrainer:
         if X.shape[1] == 0:
             raise ValueError("No numeric features available for training. Need at least one feature column.")
         
-        # Encode target if needed
+        # Encode string targets as integer codes, keeping the labels for reporting
         if y.dtype == 'object':
-            if target_column not in self.label_encoders:
-                self.label_encoders[target_column] = LabelEncoder()
-                y_encoded = self.label_encoders[target_column].fit_transform(y)
-            else:
-                y_encoded = self.label_encoders[target_column].transform(y)
+            codes, labels = pd.factorize(y, sort=True)
+            self.label_encoders[target_column] = dict(enumerate(labels))
+            y_encoded = codes
         else:
-            y_encoded = y
+            y_encoded = y.to_numpy()
         
         if len(X) < 2:
             raise ValueError("Not enough data for train/test split. Need at least 2 records.")
@@ -282,24 +565,18 @@ class MLModelTrainer:
                 X, y_encoded, test_size=test_size, random_state=random_state
             )
         
-        # Create a new scaler for this model
-        scaler = StandardScaler()
-        
-        # Scale features (only if we have features)
-        if X_train.shape[1] > 0:
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-        else:
-            raise ValueError("No features to scale. Cannot train model.")
+        # Tree-based models are scale-invariant, so features are used unscaled
+        X_train_values = X_train.to_numpy()
+        X_test_values = X_test.to_numpy()
         
         # Train model
-        print(f"\nTraining Random Forest Classifier to predict '{target_column}'...")
-        model = RandomForestClassifier(n_estimators=100, random_state=random_state, n_jobs=-1)
-        model.fit(X_train_scaled, y_train)
+        print(f"\nTraining Histogram Gradient Boosting Classifier to predict '{target_column}'...")
+        model = HistGradientBoostingClassifier(**self._model_params(len(X_train), random_state))
+        model.fit(X_train_values, y_train)
         
         # Predictions
-        y_train_pred = model.predict(X_train_scaled)
-        y_test_pred = model.predict(X_test_scaled)
+        y_train_pred = model.predict(X_train_values)
+        y_test_pred = model.predict(X_test_values)
         
         # Metrics
         train_accuracy = accuracy_score(y_train, y_train_pred)
@@ -315,12 +592,9 @@ class MLModelTrainer:
         unique_pred_classes = np.unique(y_test_pred)
         all_classes = np.unique(np.concatenate([unique_test_classes, unique_pred_classes]))
         
-        if target_column in self.label_encoders:
-            all_target_names = self.label_encoders[target_column].classes_
-            # Only include target names for classes that exist in test/pred
-            target_names = [all_target_names[i] for i in all_classes if i < len(all_target_names)]
-        else:
-            target_names = [f'Class {i}' for i in all_classes]
+        # Only include target names for classes that exist in test/pred
+        class_labels = self.label_encoders.get(target_column, {})
+        target_names = [class_labels.get(i, f'Class {i}') for i in all_classes]
         
         # Only print classification report if we have multiple classes
         if len(all_classes) > 1:
@@ -329,18 +603,22 @@ class MLModelTrainer:
             print(f"Only one class present in test set: {target_names[0] if target_names else all_classes[0]}")
             print("Classification report requires at least 2 classes.")
         
-        # Feature importance
-        feature_importance = pd.DataFrame({
-            'feature': X.columns,
-            'importance': model.feature_importances_
-        }).sort_values('importance', ascending=False)
+        # Feature importance on the test split (opt-in, it re-predicts once per feature and repeat)
+        feature_importance = None
+        if compute_importance:
+            feature_importance = self._feature_importance(
+                model, X.columns.tolist(), X_test_values, y_test, random_state
+            )
         
-        print(f"\nTop 10 Most Important Features:")
-        print(feature_importance.head(10))
+        if feature_importance is not None:
+            print(f"\nTop 10 Most Important Features:")
+            for feature, importance in feature_importance.top(10):
+                print(f"{feature}: {importance:.4f}")
         
         return {
             'model': model,
-            'scaler': scaler,
+            'scaler': None,
+            'medians': dict(self._median_cache),
             'feature_columns': X.columns.tolist(),
             'train_accuracy': train_accuracy,
             'test_accuracy': test_accuracy,
@@ -350,8 +628,22 @@ class MLModelTrainer:
             'y_test_pred': y_test_pred
         }
     
+    def _fill_missing(self, 
+                      X: np.ndarray, 
+                      feature_columns: List[str], 
+                      medians: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        Fill NaNs with the training medians (0 for features without one)
+        Uses the medians of the most recent fit when the model's own medians aren't given
+        """
+        if medians is None:
+            medians = self._median_cache
+        fill = np.array([medians.get(col, 0.0) for col in feature_columns], dtype=np.float32)
+        return np.where(np.isnan(X), fill, X)
+    
     def predict_for_entity(self, entity_id: str, model: object, 
-                            feature_columns: List[str], scaler: Optional[StandardScaler] = None) -> Dict:
+                            feature_columns: List[str], scaler: Optional[StandardScaler] = None,
+                            medians: Optional[Dict[str, float]] = None) -> Dict:
         """
         Make prediction for a single entity
         
@@ -359,66 +651,97 @@ class MLModelTrainer:
             entity_id: Entity ID (customer ID)
             model: Trained model
             feature_columns: List of feature column names used during training
-            scaler: Scaler used during training (required for proper feature scaling)
+            scaler: Scaler used during training, if any (None means features are used unscaled)
+            medians: Imputation medians from the training results ('medians')
             
         Returns:
             Dictionary with prediction
         """
-        if scaler is None:
-            raise ValueError("Scaler is required for prediction. Pass the scaler from training results.")
+        if any(col in SYNTHETIC_FEATURES for col in feature_columns):
+            return self.predict_for_entities([entity_id], model, feature_columns, scaler, medians)[0]
+        
         # Get features for entity
-        features_df = self.fs_manager.get_latest_features([entity_id])
+        features_df = self.fs_manager.get_latest_features([entity_id], use_cache=True)
         
         if len(features_df) == 0:
             raise ValueError(f"Entity {entity_id} not found in Feature Store")
         
-        # Prepare features
-        features_df = self.prepare_features(features_df)
-        
-        # Create a DataFrame with the exact feature columns used during training
-        # Fill missing columns with 0 (mean imputation for missing features)
-        # Ensure columns are in the exact order as feature_columns
-        feature_values = []
-        for col in feature_columns:
-            if col in features_df.columns:
-                val = features_df[col].iloc[0]
-                # Convert to numeric, use 0.0 if NaN or non-numeric
-                try:
-                    val = float(val) if not pd.isna(val) else 0.0
-                except (ValueError, TypeError):
-                    val = 0.0
-                feature_values.append(val)
-            else:
-                # Feature not available, use 0 as default
-                feature_values.append(0.0)
+        # Build a single-row feature array directly, without an intermediate DataFrame
+        available = features_df.iloc[0].to_dict()
+        X = np.fromiter(
+            (available.get(col, np.nan) for col in feature_columns),
+            dtype=np.float32,
+            count=len(feature_columns)
+        ).reshape(1, -1)
+        X = self._fill_missing(X, feature_columns, medians)
+        
+        if scaler is not None:
+            X_model = scaler.transform(X)
+        else:
+            X_model = X
+        prediction = model.predict(X_model)[0]
         
-        # Create DataFrame with exact column names and order
-        X = pd.DataFrame([feature_values], columns=feature_columns)
+        return {
+            'entity_id': entity_id,
+            'prediction': prediction,
+            'features_used': dict(zip(feature_columns, X[0].tolist())),
+            'all_available_features': available
+        }
+    
+    def predict_for_entities(self, entity_ids: List[str], model: object,
+                              feature_columns: List[str], scaler: Optional[StandardScaler] = None,
+                              medians: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Make predictions for several entities in one vectorized pass
         
-        # Ensure all columns are numeric
-        for col in X.columns:
-            X[col] = pd.to_numeric(X[col], errors='coerce').fillna(0.0)
+        Args:
+            entity_ids: Entity IDs (customer IDs)
+            model: Trained model
+            feature_columns: List of feature column names used during training
+            scaler: Scaler used during training, if any (None means features are used unscaled)
+            medians: Imputation medians from the training results ('medians')
+            
+        Returns:
+            List with one prediction dictionary per entity
+        """
+        # Get features for entities
+        features_df = self.fs_manager.get_latest_features(entity_ids, use_cache=True)
         
-        # Verify we have all required features
-        if set(X.columns) != set(feature_columns):
-            missing = set(feature_columns) - set(X.columns)
-            raise ValueError(f"Missing required features: {missing}. Available: {features_df.columns.tolist()}")
+        if len(features_df) == 0:
+            raise ValueError(f"Entities {entity_ids} not found in Feature Store")
         
-        # Ensure columns are in the correct order
-        X = X[feature_columns]
+        missing_entities = set(entity_ids) - set(features_df['entity_id'])
+        if missing_entities:
+            raise ValueError(f"Entities {sorted(missing_entities)} not found in Feature Store")
         
-        # Scale features using the same scaler from training
-        X_scaled = scaler.transform(X)
+        if any(col in SYNTHETIC_FEATURES for col in feature_columns):
+            self._ensure_synthetic_features(features_df)
         
-        # Predict
-        prediction = model.predict(X_scaled)[0]
+        # Build the feature matrix in the exact column order used during training
+        X = (
+            features_df.reindex(columns=feature_columns)
+            .apply(pd.to_numeric, errors='coerce')
+            .to_numpy(dtype=np.float32)
+        )
+        X = self._fill_missing(X, feature_columns, medians)
         
-        return {
-            'entity_id': entity_id,
-            'prediction': prediction,
-            'features_used': X.iloc[0].to_dict(),
-            'all_available_features': features_df.iloc[0].to_dict()
-        }
+        # Scale features with the scaler from training (if any), then predict
+        if scaler is not None:
+            X_model = scaler.transform(X)
+        else:
+            X_model = X
+        predictions = model.predict(X_model)
+        
+        all_features = features_df.to_dict(orient='records')
+        return [
+            {
+                'entity_id': entity_id,
+                'prediction': predictions[i],
+                'features_used': dict(zip(feature_columns, X[i].tolist())),
+                'all_available_features': all_features[i]
+            }
+            for i, entity_id in enumerate(features_df['entity_id'])
+        ]
     
     def close(self):
         """Close connections"""
@@ -436,7 +759,10 @@ def main():
         print("=" * 60)
         print("TRAINING REGRESSION MODEL")
         print("=" * 60)
-        regression_results = trainer.train_regression_model(target_column='avg_tx_amount_30d')
+        regression_results = trainer.train_regression_model(
+            target_column='avg_tx_amount_30d',
+            compute_importance=True
+        )
         
         # Train classification model
         print("\n" + "=" * 60)
@@ -455,7 +781,8 @@ def main():
                 'cust01',
                 regression_results['model'],
                 regression_results['feature_columns'],
-                regression_results['scaler']
+                regression_results['scaler'],
+                regression_results['medians']
             )
             print(f"Prediction for entity cust01: {prediction['prediction']:.2f}")
             print(f"Features used: {prediction['features_used']}")
@@ -4,6 +4,8 @@ Adds more sample transactions and refreshes features without dropping the databa
 """
 
 import os
+import pandas as pd
+from snowflake.connector.pandas_tools import write_pandas
 from snowflake_connection import SnowflakeConnection
 
 def refresh_data():
@@ -20,89 +22,179 @@ def refresh_data():
     print("=" * 70)
     
     try:
-        # Switch to FEAT_DB.FEAT_SCHEMA
-        sf.execute_update("USE DATABASE FEAT_DB")
-        sf.execute_update("USE SCHEMA FEAT_SCHEMA")
-        
+        # The session already uses the configured database/schema; all SQL below is unqualified
         # Add more transactions
         print("\nAdding more sample transactions...")
-        insert_query = """
-        INSERT INTO FEAT_DB.FEAT_SCHEMA.customer_transactions 
-        SELECT 
-            'tx0007'::STRING, 'cust02'::STRING, '2025-10-15 16:00:00'::TIMESTAMP_NTZ, 150.00::FLOAT, 'web'::STRING, PARSE_JSON('{"promo":"Y","items":[{"sku":"F","qty":2}]}')::VARIANT
-        UNION ALL SELECT 'tx0008'::STRING, 'cust03'::STRING, '2025-10-08 12:00:00'::TIMESTAMP_NTZ, 85.00::FLOAT, 'app'::STRING, PARSE_JSON('{"promo":"X","items":[{"sku":"G","qty":1}]}')::VARIANT
-        UNION ALL SELECT 'tx0009'::STRING, 'cust04'::STRING, '2025-10-05 14:30:00'::TIMESTAMP_NTZ, 200.00::FLOAT, 'pos'::STRING, PARSE_JSON('{"promo":"Z","items":[{"sku":"H","qty":3}]}')::VARIANT
-        UNION ALL SELECT 'tx0010'::STRING, 'cust04'::STRING, '2025-10-18 10:15:00'::TIMESTAMP_NTZ, 95.00::FLOAT, 'web'::STRING, PARSE_JSON('{"promo":null,"items":[{"sku":"I","qty":2}]}')::VARIANT
-        UNION ALL SELECT 'tx0011'::STRING, 'cust05'::STRING, '2025-10-03 09:45:00'::TIMESTAMP_NTZ, 180.00::FLOAT, 'app'::STRING, PARSE_JSON('{"promo":"Y","items":[{"sku":"J","qty":1}]}')::VARIANT
-        UNION ALL SELECT 'tx0012'::STRING, 'cust05'::STRING, '2025-10-20 15:20:00'::TIMESTAMP_NTZ, 60.00::FLOAT, 'web'::STRING, PARSE_JSON('{"promo":"X","items":[{"sku":"K","qty":4}]}')::VARIANT
-        """
+        new_transactions = pd.DataFrame({
+            'TRANSACTION_ID': ['tx0007', 'tx0008', 'tx0009', 'tx0010', 'tx0011', 'tx0012'],
+            'CUSTOMER_ID': ['cust02', 'cust03', 'cust04', 'cust04', 'cust05', 'cust05'],
+            'TRANSACTION_TS': pd.to_datetime([
+                '2025-10-15 16:00:00', '2025-10-08 12:00:00', '2025-10-05 14:30:00',
+                '2025-10-18 10:15:00', '2025-10-03 09:45:00', '2025-10-20 15:20:00'
+            ]),
+            'AMOUNT': [150.00, 85.00, 200.00, 95.00, 180.00, 60.00],
+            'CHANNEL': ['web', 'app', 'pos', 'web', 'app', 'web'],
+            'METADATA': [
+                '{"promo":"Y","items":[{"sku":"F","qty":2}]}',
+                '{"promo":"X","items":[{"sku":"G","qty":1}]}',
+                '{"promo":"Z","items":[{"sku":"H","qty":3}]}',
+                '{"promo":null,"items":[{"sku":"I","qty":2}]}',
+                '{"promo":"Y","items":[{"sku":"J","qty":1}]}',
+                '{"promo":"X","items":[{"sku":"K","qty":4}]}'
+            ]
+        })
         
-        rows = sf.execute_update(insert_query)
+        # Bulk-load through a stage (PUT + COPY) into a temp table, then cast the JSON to VARIANT
+        sf.execute_update("""
+        CREATE OR REPLACE TEMPORARY TABLE customer_transactions_stage (
+          transaction_id   STRING,
+          customer_id      STRING,
+          transaction_ts   TIMESTAMP_NTZ,
+          amount           FLOAT,
+          channel          STRING,
+          metadata         STRING
+        )
+        """)
+        write_pandas(
+            sf.conn,
+            new_transactions,
+            'CUSTOMER_TRANSACTIONS_STAGE',
+            database=sf.config['database'],
+            schema=sf.config['schema'],
+            auto_create_table=False,
+            use_logical_type=True
+        )
+        rows = sf.execute_update("""
+        INSERT INTO customer_transactions
+        SELECT transaction_id, customer_id, transaction_ts, amount, channel, PARSE_JSON(metadata)
+        FROM customer_transactions_stage
+        """)
         print(f"✓ Added {rows} new transactions")
         
-        # Refresh cleaned table
+        # Incrementally refresh cleaned table
+        # Transactions are append-only, so only rows at or after the watermark are merged in
+        # (rows at the watermark itself may be new; the MERGE skips ones already in tx_cleaned)
         print("\nRefreshing cleaned transactions table...")
         sf.execute_update("""
-        CREATE OR REPLACE TABLE FEAT_DB.FEAT_SCHEMA.tx_cleaned AS
-        SELECT
-          transaction_id,
-          customer_id,
-          transaction_ts,
-          amount,
-          channel,
-          metadata,
-          COALESCE(metadata:promo::STRING, 'NO_PROMO') AS promo_code,
-          DATE_TRUNC('day', transaction_ts)::DATE AS tx_date,
-          DAYOFWEEK(transaction_ts) as day_of_week,
-          CASE WHEN amount IS NULL THEN 0.0 ELSE amount END as amount_filled,
-          CASE WHEN amount >= 100 THEN 1 ELSE 0 END as high_value_flag
-        FROM FEAT_DB.FEAT_SCHEMA.customer_transactions
-        WHERE transaction_ts IS NOT NULL
+        CREATE TABLE IF NOT EXISTS tx_cleaned_watermark AS
+        SELECT MAX(transaction_ts) AS ts FROM tx_cleaned
+        """)
+        cleaned_rows = sf.execute_update("""
+        MERGE INTO tx_cleaned t
+        USING (
+          SELECT
+            transaction_id,
+            customer_id,
+            transaction_ts,
+            amount,
+            channel,
+            metadata,
+            COALESCE(metadata:promo::STRING, 'NO_PROMO') AS promo_code,
+            DATE_TRUNC('day', transaction_ts)::DATE AS tx_date,
+            DAYOFWEEK(transaction_ts) as day_of_week,
+            CASE WHEN amount IS NULL THEN 0.0 ELSE amount END as amount_filled,
+            CASE WHEN amount >= 100 THEN 1 ELSE 0 END as high_value_flag
+          FROM customer_transactions
+          WHERE transaction_ts IS NOT NULL
+            AND transaction_ts >= (
+              SELECT COALESCE(MAX(ts), '1970-01-01'::TIMESTAMP_NTZ)
+              FROM tx_cleaned_watermark
+            )
+        ) s
+        ON t.transaction_id = s.transaction_id
+        WHEN NOT MATCHED THEN INSERT
+          (transaction_id, customer_id, transaction_ts, amount, channel, metadata,
+           promo_code, tx_date, day_of_week, amount_filled, high_value_flag)
+        VALUES
+          (s.transaction_id, s.customer_id, s.transaction_ts, s.amount, s.channel, s.metadata,
+           s.promo_code, s.tx_date, s.day_of_week, s.amount_filled, s.high_value_flag)
         """)
-        print("✓ Refreshed tx_cleaned table")
-        
-        # Refresh aggregation view
-        print("\nRefreshing customer aggregation view...")
         sf.execute_update("""
-        CREATE OR REPLACE VIEW FEAT_DB.FEAT_SCHEMA.customer_agg_30d AS
-        SELECT
-          customer_id,
-          AVG(amount_filled) AS avg_tx_amount_30d,
-          COUNT(*) AS tx_count_30d,
-          SUM(high_value_flag) AS high_value_tx_count_30d
-        FROM FEAT_DB.FEAT_SCHEMA.tx_cleaned
-        WHERE transaction_ts >= DATEADD(day, -30, CURRENT_TIMESTAMP())
-        GROUP BY customer_id
+        UPDATE tx_cleaned_watermark
+        SET ts = (SELECT MAX(transaction_ts) FROM tx_cleaned)
         """)
-        print("✓ Refreshed customer_agg_30d view")
+        print(f"✓ Merged {cleaned_rows} new rows into tx_cleaned table")
         
-        # Refresh feature store
-        print("\nRefreshing feature store...")
+        # Refresh aggregation roll-up table and feature store in one pass over tx_cleaned
+        # A materialized view can't filter on CURRENT_TIMESTAMP(), so the 30-day roll-up
+        # is a table rebuilt here; refreshed_at records how fresh it is.
+        # The multi-table INSERT writes every aggregate row to customer_agg_30d and, for
+        # customers without the feature in the last hour, a row to feature_store
+        print("\nRefreshing customer aggregation table and feature store...")
+        # Older deployments created customer_agg_30d as a view; replace it with the table
+        agg_type = sf.execute_scalar("""
+        SELECT TABLE_TYPE FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME = 'CUSTOMER_AGG_30D'
+        """)
+        if agg_type == 'VIEW':
+            print("Migrating customer_agg_30d from a view to a table...")
+            sf.execute_update("DROP VIEW customer_agg_30d")
         sf.execute_update("""
-        INSERT INTO FEAT_DB.FEAT_SCHEMA.feature_store 
-            (feature_id, entity_id, feature_name, feature_value, created_at, feature_ts, source)
-        SELECT
-            CONCAT(customer_id, '_avg_tx_30d') as feature_id,
-            customer_id AS entity_id,
-            'avg_tx_amount_30d' AS feature_name,
-            avg_tx_amount_30d AS feature_value,
-            CURRENT_TIMESTAMP() AS created_at,
-            CURRENT_TIMESTAMP() AS feature_ts,
-            'sql_agg_30d' AS source
-        FROM FEAT_DB.FEAT_SCHEMA.customer_agg_30d
-        WHERE customer_id NOT IN (
-            SELECT entity_id 
-            FROM FEAT_DB.FEAT_SCHEMA.feature_store 
-            WHERE feature_ts >= DATEADD('hour', -1, CURRENT_TIMESTAMP())
-                AND feature_name = 'avg_tx_amount_30d'
+        CREATE TABLE IF NOT EXISTS customer_agg_30d (
+          customer_id              STRING,
+          avg_tx_amount_30d        FLOAT,
+          tx_count_30d             NUMBER,
+          high_value_tx_count_30d  NUMBER,
+          refreshed_at             TIMESTAMP_NTZ
         )
         """)
+        # One transaction, so a failed insert can't leave customer_agg_30d empty.
+        # DELETE rather than TRUNCATE so the clear is rolled back with the insert
+        refresh_statements = [
+            "BEGIN",
+            "DELETE FROM customer_agg_30d",
+            """
+            INSERT ALL
+              WHEN TRUE THEN INTO customer_agg_30d
+                (customer_id, avg_tx_amount_30d, tx_count_30d, high_value_tx_count_30d, refreshed_at)
+              VALUES (customer_id, avg_tx_amount_30d, tx_count_30d, high_value_tx_count_30d, refreshed_at)
+              WHEN needs_feature THEN INTO feature_store
+                (feature_id, entity_id, feature_name, feature_value, created_at, feature_ts, source)
+              VALUES (feature_id, customer_id, feature_name, avg_tx_amount_30d,
+                      refreshed_at, refreshed_at, source)
+            SELECT
+              a.customer_id,
+              a.avg_tx_amount_30d,
+              a.tx_count_30d,
+              a.high_value_tx_count_30d,
+              CURRENT_TIMESTAMP()::TIMESTAMP_NTZ AS refreshed_at,
+              CONCAT(a.customer_id, '_avg_tx_30d') AS feature_id,
+              'avg_tx_amount_30d' AS feature_name,
+              'sql_agg_30d' AS source,
+              r.entity_id IS NULL AS needs_feature
+            FROM (
+              SELECT
+                customer_id,
+                AVG(amount_filled) AS avg_tx_amount_30d,
+                COUNT(*) AS tx_count_30d,
+                SUM(high_value_flag) AS high_value_tx_count_30d
+              FROM tx_cleaned
+              WHERE transaction_ts >= DATEADD(day, -30, CURRENT_TIMESTAMP())
+              GROUP BY customer_id
+            ) a
+            LEFT JOIN (
+              SELECT DISTINCT entity_id
+              FROM feature_store
+              WHERE feature_name = 'avg_tx_amount_30d'
+                AND feature_ts >= DATEADD('hour', -1, CURRENT_TIMESTAMP())
+            ) r
+            ON r.entity_id = a.customer_id
+            """,
+            "COMMIT"
+        ]
+        try:
+            sf.execute_batch(refresh_statements)
+        except Exception:
+            sf.execute_update("ROLLBACK")
+            raise
+        print("✓ Refreshed customer_agg_30d table")
         print("✓ Refreshed feature store")
         
         # Check how many customers now have features
         print("\nChecking feature store status...")
-        count_df = sf.execute_query("SELECT COUNT(DISTINCT entity_id) AS customer_count FROM FEAT_DB.FEAT_SCHEMA.latest_features")
-        customer_count = count_df['CUSTOMER_COUNT'].iloc[0] if len(count_df) > 0 else 0
+        customer_count = sf.execute_scalar(
+            "SELECT COUNT(DISTINCT entity_id) FROM latest_features"
+        ) or 0
         print(f"✓ Feature store now has features for {customer_count} customers")
         
         print("\n" + "=" * 70)
@@ -3,11 +3,166 @@ Automated Feature Store Setup
 This script automatically executes the SQL setup script to create the feature store
 """
 
+import functools
+import hashlib
+import json
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from snowflake_connection import SnowflakeConnection
-from typing import Optional
+from typing import List, Optional, Tuple
+
+
+# Maximum number of consecutive DDL/DML statements sent in one multi-statement request
+MAX_BATCH_STATEMENTS = 50
+
+# Maximum number of setup statements running asynchronously at once
+MAX_ASYNC_STATEMENTS = 4
+
+# Database and schema created by feature_store_setup.sql; verification qualifies every name with them
+FEATURE_DATABASE = 'FEAT_DB'
+FEATURE_SCHEMA = 'FEAT_SCHEMA'
+
+# Tokens that matter when splitting SQL: block comments, line comments,
+# string literals ('...' with '' or backslash escapes, $$...$$) and semicolons
+_SQL_TOKEN_RE = re.compile(
+    r"/\*.*?\*/|--[^\n]*|'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|\$\$.*?\$\$|;",
+    re.S
+)
+
+# Table/view a statement writes to. Statements that don't match (USE, CREATE DATABASE,
+# ALTER, ...) may change context for everything after them, so they run as barriers
+_WRITE_TARGET_RE = re.compile(
+    r"^\s*(?:CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:LOCAL\s+|GLOBAL\s+)?TEMP(?:ORARY)?\s+|TRANSIENT\s+)?"
+    r"(?:TABLE|VIEW)(?:\s+IF\s+NOT\s+EXISTS)?"
+    r"|INSERT\s+(?:OVERWRITE\s+)?INTO|MERGE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE\s+(?:TABLE\s+)?)"
+    r"\s+([\w$.\"]+)",
+    re.I
+)
+
+# Tables/views a statement reads from
+_READ_SOURCE_RE = re.compile(r"\b(?:FROM|JOIN|USING)\s+([\w$.\"]+)", re.I)
+
+# Function calls whose arguments use FROM as a keyword, e.g. EXTRACT(year FROM ts);
+# removed before looking for read sources (one level of nested parentheses is allowed)
+_FROM_CALL_RE = re.compile(
+    r"\b(?:EXTRACT|DATE_PART|TRIM|SUBSTRING|POSITION)\s*\([^()]*(?:\([^()]*\)[^()]*)*\)",
+    re.I
+)
+
+# LIMIT clause of a display query; it sits at the end, so it's searched in the whole statement
+_LIMIT_RE = re.compile(r"\bLIMIT\s+\d", re.I)
+
+
+# Bump whenever _split_sql's output changes, so on-disk split caches from older code are ignored
+SPLIT_CACHE_VERSION = 1
+
+
+def _normalize_statement(statement: str) -> str:
+    """Join the non-empty lines of a statement with single spaces"""
+    return ' '.join(line.strip() for line in statement.splitlines() if line.strip())
+
+
+def _split_sql(sql_content: str) -> List[str]:
+    """
+    Split SQL content into individual statements
+    Comments are removed; semicolons inside string literals don't end a statement
+    """
+    statements = []
+    current_statement = []
+    pos = 0
+    
+    for match in _SQL_TOKEN_RE.finditer(sql_content):
+        token = match.group()
+        if token.startswith("'") or token.startswith('$$'):
+            # String literal, kept as part of the statement
+            continue
+    
+        current_statement.append(sql_content[pos:match.start()])
+        pos = match.end()
+        if token == ';':
+            statement = _normalize_statement(''.join(current_statement))
+            if statement:
+                statements.append(statement)
+            current_statement = []
+    
+    # Add any remaining statement (in case no semicolon at end)
+    current_statement.append(sql_content[pos:])
+    statement = _normalize_statement(''.join(current_statement))
+    if statement:
+        statements.append(statement)
+    
+    return statements
+
+
+def _object_name(name: str) -> str:
+    """Unqualified, upper-cased object name, for dependency matching"""
+    return name.replace('"', '').split('.')[-1].upper()
+
+
+def _statement_dependencies(statement: str) -> Optional[Tuple[frozenset, frozenset]]:
+    """
+    Find the objects a statement reads and writes
+    
+    Args:
+        statement: SQL statement
+        
+    Returns:
+        (reads, writes) sets of object names, or None if the statement must run as a barrier
+    """
+    stmt_upper = statement[:32].upper()
+    if stmt_upper.startswith(('SELECT', 'SHOW')):
+        writes = frozenset()
+    else:
+        match = _WRITE_TARGET_RE.match(statement)
+        if not match:
+            return None
+        writes = frozenset([_object_name(match.group(1))])
+    sources = _READ_SOURCE_RE.findall(_FROM_CALL_RE.sub(' ', statement))
+    reads = frozenset(_object_name(name) for name in sources)
+    return reads, writes
+
+
+@functools.lru_cache(maxsize=8)
+def _load_and_split(path: str, mtime: float) -> Tuple[str, ...]:
+    """
+    Read and split a SQL file, memoized per (path, mtime)
+    
+    The split result is also stored as JSON next to the SQL file (<file>.cache), keyed by
+    the SHA-256 of its content and SPLIT_CACHE_VERSION, so a fresh process can skip
+    parsing when neither the script nor the splitter has changed.
+    
+    Args:
+        path: Path to the SQL file
+        mtime: Modification time of the file, so edits invalidate the cache
+        
+    Returns:
+        Tuple of SQL statements
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    cache_path = path + '.cache'
+    
+    # JSON rather than pickle, so a planted cache file can't execute code
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == SPLIT_CACHE_VERSION and cached.get('digest') == digest:
+            return tuple(cached['statements'])
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    
+    statements = tuple(_split_sql(raw.decode('utf-8')))
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': SPLIT_CACHE_VERSION, 'digest': digest, 'statements': list(statements)}, f)
+    except OSError:
+        # Read-only checkout; the in-process cache still applies
+        pass
+    return statements
 
 
 class FeatureStoreSetup:
@@ -42,74 +197,20 @@ class FeatureStoreSetup:
     def split_sql_statements(self, sql_content: str) -> list:
         """
         Split SQL content into individual statements
-        Handles comments and multiple statements more reliably
+        Comments are removed; semicolons inside string literals don't end a statement
         """
-        statements = []
-        current_statement = []
-        in_block_comment = False
-        
-        # Remove block comments first
-        lines = []
-        for line in sql_content.split('\n'):
-            # Handle block comments
-            if '/*' in line:
-                if '*/' in line:
-                    # Comment on same line, remove it
-                    start = line.find('/*')
-                    end = line.find('*/') + 2
-                    line = line[:start] + line[end:]
-                else:
-                    # Start of block comment
-                    in_block_comment = True
-                    line = line[:line.find('/*')]
-            
-            if in_block_comment:
-                if '*/' in line:
-                    # End of block comment
-                    in_block_comment = False
-                    line = line[line.find('*/') + 2:]
-                else:
-                    # Still in comment, skip line
-                    continue
-            
-            lines.append(line)
-        
-        # Now process lines for statements
-        for line in lines:
-            # Remove inline comments (--)
-            if '--' in line:
-                comment_pos = line.find('--')
-                # Check if it's not inside a string
-                before_comment = line[:comment_pos]
-                if before_comment.count("'") % 2 == 0:  # Even number of quotes = not in string
-                    line = before_comment
-            
-            stripped = line.strip()
-            
-            # Skip empty lines
-            if not stripped:
-                continue
-            
-            # Add line to current statement
-            current_statement.append(stripped)
-            
-            # Check if line ends with semicolon (end of statement)
-            if stripped.endswith(';'):
-                # Join the statement
-                statement = ' '.join(current_statement)
-                # Remove trailing semicolon for cleaner execution
-                statement = statement.rstrip(';').strip()
-                if statement:
-                    statements.append(statement)
-                current_statement = []
-        
-        # Add any remaining statement (in case no semicolon at end)
-        if current_statement:
-            statement = ' '.join(current_statement).strip()
-            if statement and not statement.endswith(';'):
-                statements.append(statement)
+        return _split_sql(sql_content)
+    
+    def load_statements(self) -> List[str]:
+        """Read and split the SQL file, reusing the cached result if the file is unchanged"""
+        if not os.path.exists(self.sql_file_path):
+            raise FileNotFoundError(
+                f"SQL file not found: {self.sql_file_path}\n"
+                f"Please ensure sql/snowflake_feature_engineering.sql exists"
+            )
         
-        return statements
+        path = os.path.abspath(self.sql_file_path)
+        return list(_load_and_split(path, os.path.getmtime(path)))
     
     def execute_setup(self, drop_existing: bool = False) -> dict:
         """
@@ -135,36 +236,22 @@ class FeatureStoreSetup:
         # Read SQL file
         print("Step 2: Reading SQL setup script...")
         try:
-            sql_content = self.read_sql_file()
+            statements = self.load_statements()
             print(f"✓ SQL file loaded: {self.sql_file_path}\n")
         except Exception as e:
             self.sf.close()
             raise
         
-        # Split into statements
+        # Split into statements (cached while the file is unchanged)
         print("Step 3: Parsing SQL statements...")
-        statements = self.split_sql_statements(sql_content)
         print(f"✓ Found {len(statements)} SQL statements to execute\n")
         
         # Optionally drop existing objects
         if drop_existing:
             print("Step 4: Dropping existing objects (if any)...")
             try:
-                drop_statements = [
-                    "DROP VIEW IF EXISTS FEAT_DB.FEAT_SCHEMA.latest_features",
-                    "DROP TABLE IF EXISTS FEAT_DB.FEAT_SCHEMA.feature_store",
-                    "DROP VIEW IF EXISTS FEAT_DB.FEAT_SCHEMA.customer_agg_30d",
-                    "DROP TABLE IF EXISTS FEAT_DB.FEAT_SCHEMA.tx_cleaned",
-                    "DROP TABLE IF EXISTS FEAT_DB.FEAT_SCHEMA.customer_transactions",
-                    "DROP SCHEMA IF EXISTS FEAT_DB.FEAT_SCHEMA",
-                    "DROP DATABASE IF EXISTS FEAT_DB"
-                ]
-                for stmt in drop_statements:
-                    try:
-                        self.sf.execute_update(stmt)
-                    except Exception as e:
-                        # Ignore errors if objects don't exist
-                        pass
+                # Dropping the database cascades to its schema, tables and views
+                self.sf.execute_update(f"DROP DATABASE IF EXISTS {FEATURE_DATABASE} CASCADE")
                 print("✓ Cleanup completed\n")
             except Exception as e:
                 print(f"⚠ Warning during cleanup: {e}\n")
@@ -180,9 +267,63 @@ class FeatureStoreSetup:
             'errors': []
         }
         
+        # DDL/DML statements run asynchronously, up to MAX_ASYNC_STATEMENTS at a time. Each one
+        # only waits for in-flight statements that touch the same tables or views.
+        # Barrier statements (USE, CREATE DATABASE/SCHEMA, ...) wait for everything in flight;
+        # consecutive barriers are sent to Snowflake as one multi-statement request
+        pending = []
+        in_flight = []
+        # Tables each created view reads, so reading a view also waits for writes to its tables
+        view_sources = {}
+        
         for i, statement in enumerate(statements, 1):
+            # Show what we're executing
+            statement_preview = statement[:60].replace('\n', ' ')
+            if len(statement) > 60:
+                statement_preview += "..."
+            
+            # Only the leading keyword matters, so upper-case just the head of the statement
+            stmt_upper = statement.strip()[:32].upper()
+            dependencies = _statement_dependencies(statement)
+            if dependencies is None:
+                # Barrier, queue it for the next batch once everything before it has finished
+                in_flight = self._wait_async(in_flight, results)
+                pending.append((i, statement, statement_preview))
+                if len(pending) >= MAX_BATCH_STATEMENTS:
+                    self._execute_batch(pending, len(statements), results)
+                    pending = []
+                continue
+            
+            if pending:
+                self._execute_batch(pending, len(statements), results)
+                pending = []
+            
+            # Wait for in-flight statements this one depends on (or would overwrite).
+            # SHOW lists metadata, so it waits for everything
+            reads, writes = dependencies
+            reads = reads.union(*(view_sources.get(name, ()) for name in reads))
+            if stmt_upper.startswith('CREATE') and ' VIEW ' in stmt_upper:
+                view_sources.update((name, reads) for name in writes)
+            in_flight = self._wait_async(
+                in_flight, 
+                results, 
+                None if stmt_upper.startswith('SHOW') else lambda r, w: bool(w & (reads | writes) or r & writes)
+            )
+            
+            if not stmt_upper.startswith(('SELECT', 'SHOW')):
+                # It's an update statement (CREATE, INSERT, etc.), submit it asynchronously
+                if len(in_flight) >= MAX_ASYNC_STATEMENTS:
+                    in_flight = self._wait_async(in_flight[:1], results) + in_flight[1:]
+                print(f"[{i}/{len(statements)}] Executing: {statement_preview}")
+                try:
+                    cursor = self.sf.execute_async(statement)
+                    in_flight.append((i, statement_preview, cursor, reads, writes))
+                except Exception as e:
+                    self._record_failure(results, i, statement_preview, str(e))
+                continue
+            
             # Skip SELECT statements that are just for display
-            if statement.strip().upper().startswith('SELECT') and 'LIMIT' in statement.upper():
+            if stmt_upper.startswith('SELECT') and _LIMIT_RE.search(statement):
                 print(f"[{i}/{len(statements)}] Skipping display query: {statement[:50]}...")
                 try:
                     # Still execute to show results
@@ -194,48 +335,34 @@ class FeatureStoreSetup:
                     print(f"    (Query failed, but continuing...)")
                 continue
             
-            # Show what we're executing
-            statement_preview = statement[:60].replace('\n', ' ')
-            if len(statement) > 60:
-                statement_preview += "..."
-            
             print(f"[{i}/{len(statements)}] Executing: {statement_preview}")
             
             try:
-                # Determine if it's a query (SELECT) or update (CREATE, INSERT, etc.)
-                stmt_upper = statement.strip().upper()
-                
-                if stmt_upper.startswith('SELECT') or stmt_upper.startswith('SHOW'):
-                    # It's a query, use execute_query
-                    df = self.sf.execute_query(statement)
-                    if len(df) > 0:
-                        print(f"    ✓ Success - {len(df)} rows returned")
-                        # Show preview for small results
-                        if len(df) <= 10:
-                            print(df.to_string(index=False))
-                    else:
-                        print(f"    ✓ Success - No rows returned")
+                # It's a query, use execute_query
+                df = self.sf.execute_query(statement)
+                if len(df) > 0:
+                    print(f"    ✓ Success - {len(df)} rows returned")
+                    # Show preview for small results
+                    if len(df) <= 10:
+                        print(df.to_string(index=False))
                 else:
-                    # It's an update statement
-                    rows_affected = self.sf.execute_update(statement)
-                    print(f"    ✓ Success - {rows_affected} rows affected")
+                    print(f"    ✓ Success - No rows returned")
                 
                 results['successful'] += 1
                 
             except Exception as e:
-                error_msg = str(e)
-                print(f"    ✗ Failed: {error_msg}")
-                results['failed'] += 1
-                results['errors'].append({
-                    'statement_number': i,
-                    'statement': statement_preview,
-                    'error': error_msg
-                })
+                self._record_failure(results, i, statement_preview, str(e))
                 # Continue with next statement
                 continue
             
             print()
         
+        if pending:
+            self._execute_batch(pending, len(statements), results)
+        if in_flight:
+            self._wait_async(in_flight, results)
+            print()
+        
         # Summary
         print("=" * 70)
         print("SETUP SUMMARY")
@@ -261,6 +388,74 @@ class FeatureStoreSetup:
         
         return results
     
+    def _record_failure(self, results: dict, statement_number: int, statement_preview: str, error_msg: str):
+        """Record a failed statement in the execution results"""
+        print(f"    ✗ Failed: {error_msg}")
+        results['failed'] += 1
+        results['errors'].append({
+            'statement_number': statement_number,
+            'statement': statement_preview,
+            'error': error_msg
+        })
+    
+    def _wait_async(self, in_flight: list, results: dict, blocks=None) -> list:
+        """
+        Wait for in-flight asynchronous statements and record their outcome
+        
+        Args:
+            in_flight: (statement number, preview, cursor, reads, writes) tuples
+            results: Execution results to update
+            blocks: Called with (reads, writes) of an in-flight statement; only statements
+                it returns True for are waited on. Waits for all if None
+                
+        Returns:
+            The statements still in flight
+        """
+        still_running = []
+        for i, statement_preview, cursor, reads, writes in in_flight:
+            if blocks is not None and not blocks(reads, writes):
+                still_running.append((i, statement_preview, cursor, reads, writes))
+                continue
+            try:
+                self.sf.wait_async(cursor)
+                print(f"    [{i}] ✓ Success")
+                results['successful'] += 1
+            except Exception as e:
+                self._record_failure(results, i, statement_preview, str(e))
+        return still_running
+    
+    def _execute_batch(self, batch: List[Tuple[int, str, str]], total: int, results: dict):
+        """
+        Execute queued update statements in one round-trip and record the outcome
+        
+        Args:
+            batch: (statement number, statement, preview) tuples
+            total: Total number of statements, for progress output
+            results: Execution results to update
+        """
+        for i, _, statement_preview in batch:
+            print(f"[{i}/{total}] Executing: {statement_preview}")
+        
+        try:
+            rowcounts = self.sf.execute_batch([statement for _, statement, _ in batch])
+        except Exception as e:
+            # Snowflake stops at the first failing statement, but doesn't say which one it was
+            error_msg = str(e)
+            first, last = batch[0][0], batch[-1][0]
+            print(f"    ✗ Failed: statements {first}-{last}: {error_msg}\n")
+            results['failed'] += len(batch)
+            results['errors'].append({
+                'statement_number': f"{first}-{last}" if first != last else first,
+                'statement': batch[0][2],
+                'error': error_msg
+            })
+            return
+        
+        for (i, _, _), rows_affected in zip(batch, rowcounts):
+            print(f"    [{i}] ✓ Success - {rows_affected} rows affected")
+        results['successful'] += len(batch)
+        print()
+    
     def verify_setup(self) -> dict:
         """
         Verify that the feature store was set up correctly
@@ -285,68 +480,97 @@ class FeatureStoreSetup:
             'data_counts': {}
         }
         
+        # The metadata probes are independent, so run them concurrently on separate cursors.
+        # Each entry is (query, returns a single value)
+        probes = {
+            # Filtered server-side instead of listing every database/schema in the account.
+            # SHOW ... LIKE works for any role; SNOWFLAKE.INFORMATION_SCHEMA needs imported privileges
+            # In LIKE, '_' matches any character, so the returned names are checked exactly
+            'databases': (f"SHOW DATABASES LIKE '{FEATURE_DATABASE}'", False),
+            'schemas': (f"""
+                SELECT COUNT(*)
+                FROM {FEATURE_DATABASE}.INFORMATION_SCHEMA.SCHEMATA
+                WHERE SCHEMA_NAME = '{FEATURE_SCHEMA}'
+            """, True),
+            'objects': (f"""
+                SELECT TABLE_NAME, TABLE_TYPE, ROW_COUNT
+                FROM {FEATURE_DATABASE}.INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = '{FEATURE_SCHEMA}'
+            """, False)
+        }
+        
+        def run_probe(query: str, scalar: bool):
+            with self.sf.pooled_cursor() as cursor:
+                if scalar:
+                    return self.sf.execute_scalar(query, cursor=cursor)
+                return self.sf.execute_query(query, cursor=cursor)
+        
         try:
+            with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+                futures = {name: executor.submit(run_probe, *probe) for name, probe in probes.items()}
+            
             # Check database
             try:
-                df = self.sf.execute_query("SHOW DATABASES")
-                # Filter in Python since LIKE doesn't work in SHOW commands
-                db_df = df[df['name'] == 'FEAT_DB'] if 'name' in df.columns else pd.DataFrame()
-                verification['database_exists'] = len(db_df) > 0
-                print(f"✓ Database FEAT_DB exists: {verification['database_exists']}")
+                df = futures['databases'].result()
+                verification['database_exists'] = 'name' in df.columns and bool((df['name'] == FEATURE_DATABASE).any())
+                print(f"✓ Database {FEATURE_DATABASE} exists: {verification['database_exists']}")
             except Exception as e:
                 print(f"✗ Error checking database: {e}")
             
             # Check schema
             try:
-                df = self.sf.execute_query("SHOW SCHEMAS IN DATABASE FEAT_DB")
-                # Filter in Python since LIKE doesn't work in SHOW commands
-                schema_df = df[df['name'] == 'FEAT_SCHEMA'] if 'name' in df.columns else pd.DataFrame()
-                verification['schema_exists'] = len(schema_df) > 0
-                print(f"✓ Schema FEAT_SCHEMA exists: {verification['schema_exists']}")
+                verification['schema_exists'] = bool(futures['schemas'].result())
+                print(f"✓ Schema {FEATURE_SCHEMA} exists: {verification['schema_exists']}")
             except Exception as e:
                 print(f"✗ Error checking schema: {e}")
             
-            # Check tables
-            tables_to_check = ['customer_transactions', 'tx_cleaned', 'feature_store']
+            # Check tables and views
+            tables_to_check = ['customer_transactions', 'tx_cleaned', 'customer_agg_30d', 'feature_store']
+            views_to_check = ['latest_features']
             try:
-                df = self.sf.execute_query("SHOW TABLES IN SCHEMA FEAT_DB.FEAT_SCHEMA")
-                existing_tables = df['name'].str.upper().tolist() if 'name' in df.columns else []
+                df = futures['objects'].result()
+                objects = dict(zip(df['TABLE_NAME'], zip(df['TABLE_TYPE'], df['ROW_COUNT']))) if len(df) > 0 else {}
                 
                 for table in tables_to_check:
-                    exists = table.upper() in existing_tables
+                    table_type, row_count = objects.get(table.upper(), (None, None))
+                    exists = table_type is not None and table_type != 'VIEW'
                     verification['tables'][table] = exists
                     
                     if exists:
-                        # Get row count
-                        count_df = self.sf.execute_query(f"SELECT COUNT(*) AS cnt FROM FEAT_DB.FEAT_SCHEMA.{table}")
-                        count = count_df['CNT'].iloc[0] if len(count_df) > 0 else 0
+                        # Snowflake keeps ROW_COUNT up to date for tables
+                        count = int(row_count) if pd.notna(row_count) else 0
                         verification['data_counts'][table] = count
                         print(f"✓ Table {table} exists with {count} rows")
                     else:
                         print(f"✗ Table {table} does not exist")
-            except Exception as e:
-                print(f"✗ Error checking tables: {e}")
-            
-            # Check views
-            views_to_check = ['customer_agg_30d', 'latest_features']
-            try:
-                df = self.sf.execute_query("SHOW VIEWS IN SCHEMA FEAT_DB.FEAT_SCHEMA")
-                existing_views = df['name'].str.upper().tolist() if 'name' in df.columns else []
+                
+                existing_views = [
+                    view for view in views_to_check 
+                    if objects.get(view.upper(), (None, None))[0] == 'VIEW'
+                ]
+                
+                # Views have no ROW_COUNT, so count them directly, all in one query.
+                # Qualified like the probes, whatever database the session is using
+                view_counts = {}
+                if existing_views:
+                    count_df = self.sf.execute_query(" UNION ALL ".join(
+                        f"SELECT '{view}' AS name, COUNT(*) AS cnt FROM {FEATURE_DATABASE}.{FEATURE_SCHEMA}.{view}"
+                        for view in existing_views
+                    ))
+                    view_counts = dict(zip(count_df['NAME'], count_df['CNT']))
                 
                 for view in views_to_check:
-                    exists = view.upper() in existing_views
+                    exists = view in existing_views
                     verification['views'][view] = exists
                     
                     if exists:
-                        # Get row count
-                        count_df = self.sf.execute_query(f"SELECT COUNT(*) AS cnt FROM FEAT_DB.FEAT_SCHEMA.{view}")
-                        count = count_df['CNT'].iloc[0] if len(count_df) > 0 else 0
+                        count = int(view_counts.get(view, 0))
                         verification['data_counts'][view] = count
                         print(f"✓ View {view} exists with {count} rows")
                     else:
                         print(f"✗ View {view} does not exist")
             except Exception as e:
-                print(f"✗ Error checking views: {e}")
+                print(f"✗ Error checking tables and views: {e}")
             
         except Exception as e:
             print(f"✗ Verification error: {e}")
@@ -4,12 +4,60 @@ Handles connection to Snowflake and basic operations
 """
 
 import snowflake.connector
+from snowflake.connector.errors import NotSupportedError
+import atexit
 import json
 import os
-from typing import Dict, Optional
+import queue
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import pandas as pd
 
 
+# Idle connections kept per config so later SnowflakeConnection objects in the same
+# process skip the TLS handshake and authentication
+MAX_IDLE_CONNECTIONS = 4
+# Seconds between keep-alive heartbeats, so pooled sessions don't expire while idle
+KEEP_ALIVE_HEARTBEAT_FREQUENCY = 900
+
+_idle_connections: Dict[Tuple, List] = {}
+_idle_lock = threading.Lock()
+
+
+def _pool_key(config: Dict) -> Tuple:
+    """Connections are only shared between identical configs"""
+    return tuple(sorted((k, str(v)) for k, v in config.items()))
+
+
+def _close_idle_connections():
+    """Close all pooled connections (registered with atexit)"""
+    with _idle_lock:
+        conns = [conn for idle in _idle_connections.values() for conn in idle]
+        _idle_connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _reset_idle_connections_after_fork():
+    """
+    Forget the parent's pooled connections in a forked child
+    The sessions still belong to the parent, so they are dropped without being closed
+    """
+    global _idle_connections, _idle_lock
+    _idle_connections = {}
+    _idle_lock = threading.Lock()
+
+
+atexit.register(_close_idle_connections)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_idle_connections_after_fork)
+
+
 class SnowflakeConnection:
     """Manages Snowflake database connections"""
     
@@ -36,19 +84,28 @@ class SnowflakeConnection:
         
         self.conn = None
         self.cursor = None
+        # Idle cursors lent to concurrent callers so they don't share self.cursor
+        self._cursor_pool = queue.Queue()
     
     def connect(self):
         """Establish connection to Snowflake"""
         try:
-            self.conn = snowflake.connector.connect(
+            self.conn = self._get_idle_connection()
+            reused = self.conn is not None
+            self.conn = self.conn or snowflake.connector.connect(
                 user=self.config['user'],
                 password=self.config['password'],
                 account=self.config['account'],
                 warehouse=self.config['warehouse'],
                 database=self.config['database'],
-                schema=self.config['schema']
+                schema=self.config['schema'],
+                client_session_keep_alive=True,
+                client_session_keep_alive_heartbeat_frequency=KEEP_ALIVE_HEARTBEAT_FREQUENCY
             )
             self.cursor = self.conn.cursor()
+            if reused:
+                # Fresh sessions already start in the configured database/schema
+                self._use_configured_context()
             print(f"Successfully connected to Snowflake")
             print(f"Database: {self.config['database']}")
             print(f"Schema: {self.config['schema']}")
@@ -57,12 +114,66 @@ class SnowflakeConnection:
             print(f"Error connecting to Snowflake: {e}")
             return False
     
-    def execute_query(self, query: str) -> pd.DataFrame:
+    def _use_configured_context(self):
+        """
+        Make the configured database/schema current, so queries can use unqualified names
+        Pooled connections may have been switched elsewhere by an earlier user
+        """
+        try:
+            self.cursor.execute(f"USE DATABASE {self.config['database']}")
+            self.cursor.execute(f"USE SCHEMA {self.config['schema']}")
+        except Exception as e:
+            # The database doesn't exist yet, e.g. before the setup script has run
+            print(f"Note: could not use {self.config['database']}.{self.config['schema']}: {e}")
+    
+    def _get_idle_connection(self):
+        """Take a still-open pooled connection for this config, if any"""
+        with _idle_lock:
+            idle = _idle_connections.get(_pool_key(self.config), [])
+            while idle:
+                conn = idle.pop()
+                if not conn.is_closed():
+                    return conn
+        return None
+    
+    def _release_connection(self, conn) -> bool:
+        """Return a connection to the idle pool. Returns False if the pool is full"""
+        with _idle_lock:
+            idle = _idle_connections.setdefault(_pool_key(self.config), [])
+            if len(idle) >= MAX_IDLE_CONNECTIONS or conn.is_closed():
+                return False
+            idle.append(conn)
+            return True
+    
+    @contextmanager
+    def pooled_cursor(self):
+        """
+        Borrow a cursor for use from another thread
+        The cursor goes back to the pool when the block exits
+        """
+        if not self.conn:
+            raise Exception("Not connected to Snowflake. Call connect() first.")
+        
+        try:
+            cursor = self._cursor_pool.get_nowait()
+        except queue.Empty:
+            cursor = self.conn.cursor()
+        try:
+            yield cursor
+        finally:
+            self._cursor_pool.put(cursor)
+    
+    def execute_query(self, 
+                      query: str, 
+                      params: Optional[Sequence] = None,
+                      cursor=None) -> pd.DataFrame:
         """
         Execute SQL query and return results as DataFrame
         
         Args:
             query: SQL query string
+            params: Values for %s bind markers in the query
+            cursor: Cursor to run the query on (e.g. from pooled_cursor()). Defaults to self.cursor
             
         Returns:
             pandas DataFrame with query results
@@ -70,22 +181,125 @@ class SnowflakeConnection:
         if not self.conn:
             raise Exception("Not connected to Snowflake. Call connect() first.")
         
+        cursor = cursor or self.cursor
+        try:
+            cursor.execute(query, params)
+            try:
+                # Build the DataFrame straight from the Arrow result chunks
+                return cursor.fetch_pandas_all()
+            except NotSupportedError:
+                # SHOW/DESCRIBE and other non-Arrow results
+                results = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+                return pd.DataFrame(results, columns=columns)
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            raise
+    
+    def execute_scalar(self, query: str, params: Optional[Sequence] = None, cursor=None):
+        """
+        Execute SQL query and return the first column of the first row
+        
+        Args:
+            query: SQL query string
+            params: Values for %s bind markers in the query
+            cursor: Cursor to run the query on (e.g. from pooled_cursor()). Defaults to self.cursor
+            
+        Returns:
+            The value, or None if the query returned no rows
+        """
+        if not self.conn:
+            raise Exception("Not connected to Snowflake. Call connect() first.")
+        
+        cursor = cursor or self.cursor
         try:
-            self.cursor.execute(query)
-            results = self.cursor.fetchall()
-            columns = [desc[0] for desc in self.cursor.description]
-            df = pd.DataFrame(results, columns=columns)
-            return df
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return row[0] if row else None
         except Exception as e:
             print(f"Error executing query: {e}")
             raise
     
-    def execute_update(self, query: str) -> int:
+    def stream_query(self, query: str, params: Optional[Sequence] = None) -> Iterator:
+        """
+        Execute SQL query and stream results as Arrow batches
+        Only one result chunk is held in memory at a time
+        
+        Args:
+            query: SQL query string
+            params: Values for %s bind markers in the query
+            
+        Yields:
+            pyarrow Tables, one per result chunk downloaded from Snowflake
+        """
+        if not self.conn:
+            raise Exception("Not connected to Snowflake. Call connect() first.")
+        
+        # Dedicated cursor so other queries can run while the stream is consumed
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            for batch in cursor.fetch_arrow_batches():
+                yield batch
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            raise
+        finally:
+            cursor.close()
+    
+    def execute_async(self, query: str, params: Optional[Sequence] = None):
+        """
+        Submit a statement without waiting for it to finish
+        
+        Args:
+            query: SQL query string
+            params: Values for %s bind markers in the query
+            
+        Returns:
+            Cursor the statement runs on; pass it to wait_async()
+        """
+        if not self.conn:
+            raise Exception("Not connected to Snowflake. Call connect() first.")
+        
+        # One cursor per in-flight statement
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute_async(query, params)
+            return cursor
+        except Exception as e:
+            cursor.close()
+            print(f"Error executing update: {e}")
+            raise
+    
+    def wait_async(self, cursor, poll_interval: float = 0.1):
+        """
+        Wait for a statement submitted with execute_async() and close its cursor
+        
+        Args:
+            cursor: Cursor returned by execute_async()
+            poll_interval: Seconds between status checks
+            
+        Raises:
+            The statement's error if it failed
+        """
+        try:
+            query_id = cursor.sfqid
+            while self.conn.is_still_running(self.conn.get_query_status(query_id)):
+                time.sleep(poll_interval)
+            self.conn.get_query_status_throw_if_error(query_id)
+        except Exception as e:
+            print(f"Error executing update: {e}")
+            raise
+        finally:
+            cursor.close()
+    
+    def execute_update(self, query: str, params: Optional[Sequence] = None) -> int:
         """
         Execute UPDATE/INSERT/DELETE query
         
         Args:
             query: SQL query string
+            params: Values for %s bind markers in the query
             
         Returns:
             Number of rows affected
@@ -94,18 +308,54 @@ class SnowflakeConnection:
             raise Exception("Not connected to Snowflake. Call connect() first.")
         
         try:
-            self.cursor.execute(query)
+            self.cursor.execute(query, params)
             return self.cursor.rowcount
         except Exception as e:
             print(f"Error executing update: {e}")
             raise
     
-    def close(self):
-        """Close connection to Snowflake"""
+    def execute_batch(self, statements: List[str]) -> List[int]:
+        """
+        Execute several statements in a single multi-statement request
+        
+        Args:
+            statements: SQL statements (without trailing semicolons)
+            
+        Returns:
+            Number of rows affected by each statement, in order
+        """
+        if not self.conn:
+            raise Exception("Not connected to Snowflake. Call connect() first.")
+        
+        try:
+            self.cursor.execute(";\n".join(statements), num_statements=len(statements))
+            rowcounts = [self.cursor.rowcount]
+            while self.cursor.nextset():
+                rowcounts.append(self.cursor.rowcount)
+            return rowcounts
+        except Exception as e:
+            print(f"Error executing batch: {e}")
+            raise
+    
+    def close(self, keep_alive: bool = True):
+        """
+        Close connection to Snowflake
+        
+        Args:
+            keep_alive: If True, keep the session in the idle pool for the next connect()
+                in this process. Pass False in short-lived processes (e.g. worker processes,
+                which exit without running atexit handlers) so the session is really closed
+        """
+        while not self._cursor_pool.empty():
+            self._cursor_pool.get_nowait().close()
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
+            # Keep the authenticated session for the next connect() in this process
+            if not (keep_alive and self._release_connection(self.conn)):
+                self.conn.close()
+            self.conn = None
         print("Connection closed")
     
     def __enter__(self):
@@ -58,14 +58,22 @@ SELECT
 FROM customer_transactions
 WHERE transaction_ts IS NOT NULL;
 
+-- Watermark of the newest cleaned transaction, used by scripts/refresh_feature_data.py
+-- to merge only new transactions into tx_cleaned
+CREATE OR REPLACE TABLE tx_cleaned_watermark AS
+SELECT MAX(transaction_ts) AS ts FROM tx_cleaned;
+
 -- 5. Example aggregation SQL: compute avg amount last 30 days per customer
 -- For demo we use relative dates; in production use proper windows or timestamp filtering.
-CREATE OR REPLACE VIEW customer_agg_30d AS
+-- Stored as a roll-up table (materialized views can't use CURRENT_TIMESTAMP());
+-- scripts/refresh_feature_data.py rebuilds it, refreshed_at shows how fresh it is.
+CREATE OR REPLACE TABLE customer_agg_30d AS
 SELECT
   customer_id,
   AVG(amount_filled) AS avg_tx_amount_30d,
   COUNT(*) AS tx_count_30d,
-  SUM(high_value_flag) AS high_value_tx_count_30d
+  SUM(high_value_flag) AS high_value_tx_count_30d,
+  CURRENT_TIMESTAMP()::TIMESTAMP_NTZ AS refreshed_at
 FROM tx_cleaned
 WHERE transaction_ts >= DATEADD(day, -30, CURRENT_TIMESTAMP())
 GROUP BY customer_id;
@@ -0,0 +1,154 @@
+"""
+Tests for the SQL splitting and dependency analysis in setup_feature_store.py
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from setup_feature_store import _split_sql, _statement_dependencies
+
+SQL_FILE = os.path.join(os.path.dirname(__file__), '..', 'sql', 'snowflake_feature_engineering.sql')
+
+
+# ---- _split_sql ----
+
+def test_split_on_semicolons():
+    assert _split_sql("SELECT 1; SELECT 2;") == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_keeps_statement_without_trailing_semicolon():
+    assert _split_sql("SELECT 1;\nSELECT 2") == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_joins_lines_with_single_spaces():
+    assert _split_sql("SELECT a,\n   b\n\nFROM t;") == ["SELECT a, b FROM t"]
+
+
+def test_split_ignores_semicolon_in_string_literal():
+    assert _split_sql("SELECT 'a;b'; SELECT 2;") == ["SELECT 'a;b'", "SELECT 2"]
+
+
+def test_split_handles_doubled_and_backslash_quotes():
+    sql = "SELECT 'it''s; here'; SELECT 'back\\'slash;'; SELECT 3;"
+    assert _split_sql(sql) == ["SELECT 'it''s; here'", "SELECT 'back\\'slash;'", "SELECT 3"]
+
+
+def test_split_ignores_semicolons_in_dollar_quoted_body():
+    sql = "CREATE FUNCTION f() RETURNS INT AS $$\n  SELECT 1; SELECT 2;\n$$;\nSELECT 3;"
+    statements = _split_sql(sql)
+    assert len(statements) == 2
+    assert "SELECT 1; SELECT 2;" in statements[0]
+    assert statements[1] == "SELECT 3"
+
+
+def test_split_removes_line_comments():
+    sql = "-- header; not a statement\nSELECT 1; -- trailing; comment\nSELECT 2;"
+    assert _split_sql(sql) == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_removes_block_comments():
+    sql = "/* setup;\n   notes */\nSELECT 1,\n/* inline; */\n2;"
+    assert _split_sql(sql) == ["SELECT 1, 2"]
+
+
+def test_split_keeps_comment_markers_inside_literals():
+    assert _split_sql("SELECT '-- not a comment', '/* nor this */';") == [
+        "SELECT '-- not a comment', '/* nor this */'"
+    ]
+
+
+def test_split_skips_empty_statements():
+    assert _split_sql(";;\n-- only a comment\n;") == []
+
+
+def test_split_bundled_script():
+    with open(SQL_FILE, 'r', encoding='utf-8') as f:
+        statements = _split_sql(f.read())
+    assert len(statements) == 15
+    assert statements[0] == "CREATE DATABASE IF NOT EXISTS FEAT_DB"
+    assert not any('--' in statement for statement in statements)
+
+
+# ---- _statement_dependencies ----
+
+def test_context_changing_statements_are_barriers():
+    for statement in ("USE DATABASE FEAT_DB", "CREATE DATABASE IF NOT EXISTS FEAT_DB",
+                      "CREATE SCHEMA IF NOT EXISTS FEAT_SCHEMA", "ALTER TABLE t ADD COLUMN c INT"):
+        assert _statement_dependencies(statement) is None
+
+
+def test_create_table_as_select_reads_and_writes():
+    reads, writes = _statement_dependencies(
+        "CREATE OR REPLACE TABLE tx_cleaned AS SELECT * FROM customer_transactions"
+    )
+    assert writes == {'TX_CLEANED'}
+    assert reads == {'CUSTOMER_TRANSACTIONS'}
+
+
+def test_select_only_reads():
+    reads, writes = _statement_dependencies(
+        "SELECT a.x FROM tx_cleaned a JOIN customer_agg_30d b ON a.customer_id = b.customer_id"
+    )
+    assert writes == frozenset()
+    assert reads == {'TX_CLEANED', 'CUSTOMER_AGG_30D'}
+
+
+def test_view_writes_its_name():
+    reads, writes = _statement_dependencies(
+        "CREATE OR REPLACE VIEW latest_features AS SELECT * FROM feature_store"
+    )
+    assert writes == {'LATEST_FEATURES'}
+    assert reads == {'FEATURE_STORE'}
+
+
+def test_merge_reads_using_source():
+    reads, writes = _statement_dependencies(
+        "MERGE INTO feature_store t USING customer_agg_30d s ON t.entity_id = s.customer_id "
+        "WHEN MATCHED THEN UPDATE SET t.value = s.avg_tx_amount_30d"
+    )
+    assert writes == {'FEATURE_STORE'}
+    assert 'CUSTOMER_AGG_30D' in reads
+
+
+def test_qualified_and_quoted_names_match_unqualified():
+    reads, writes = _statement_dependencies(
+        'INSERT INTO FEAT_DB.FEAT_SCHEMA."feature_store" SELECT * FROM FEAT_SCHEMA.customer_agg_30d'
+    )
+    assert writes == {'FEATURE_STORE'}
+    assert reads == {'CUSTOMER_AGG_30D'}
+
+
+def test_temporary_table_writes_its_name():
+    _, writes = _statement_dependencies("CREATE TEMPORARY TABLE stage_rows (id INT)")
+    assert writes == {'STAGE_ROWS'}
+
+
+def test_extract_from_is_not_a_read():
+    reads, writes = _statement_dependencies(
+        "CREATE TABLE by_year AS SELECT EXTRACT(year FROM ts) AS y, "
+        "TRIM(BOTH ' ' FROM TO_VARCHAR(name)) AS n FROM events"
+    )
+    assert writes == {'BY_YEAR'}
+    assert reads == {'EVENTS'}
+
+
+def test_bundled_script_dependency_edges():
+    with open(SQL_FILE, 'r', encoding='utf-8') as f:
+        statements = _split_sql(f.read())
+    dependencies = [_statement_dependencies(statement) for statement in statements]
+    
+    # The script starts by creating and switching to its database and schema
+    assert dependencies[:4] == [None] * 4
+    
+    writers = {}
+    for deps in dependencies:
+        if deps is not None:
+            for name in deps[1]:
+                writers.setdefault(name, deps)
+    
+    assert {'CUSTOMER_TRANSACTIONS', 'TX_CLEANED', 'CUSTOMER_AGG_30D'} <= set(writers)
+    assert 'CUSTOMER_TRANSACTIONS' in writers['TX_CLEANED'][0]
+    assert 'TX_CLEANED' in writers['CUSTOMER_AGG_30D'][0]